@@ -0,0 +1,47 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import codegra_fs.cgfs as cgfs  # isort:skip
+from stand_in import StandInServer  # isort:skip
+from codegra_fs.cgapi import CGAPI  # isort:skip
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as s:
+        yield s
+
+
+@pytest.fixture
+def make_fs():
+    made = []
+
+    def make(server, api_kwargs=None, **kwargs):
+        cgfs.cgapi = CGAPI.from_username_and_password(
+            'robin', 'Robin', server.url, **(api_kwargs or {})
+        )
+        tmpdir = tempfile.mkdtemp()
+        fs = cgfs.CGFS(
+            latest_only=True,
+            socketfile=os.path.join(tmpdir, 'socket'),
+            mountpoint=os.path.join(tmpdir, 'mnt'),
+            tmpdir=tmpdir,
+            **kwargs
+        )
+        made.append((fs, tmpdir))
+        return fs
+
+    yield make
+
+    for fs, tmpdir in made:
+        fs.api_handler.stop = True
+        fs.socket.close()
+        shutil.rmtree(tmpdir)
+
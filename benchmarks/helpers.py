@@ -0,0 +1,54 @@
+import os
+import time
+import contextlib
+
+
+def list_dir(fs, path):
+    """Get the ``(name, attrs)`` pairs returned by readdir, where ``attrs`` is
+    ``None`` if readdir did not return them.
+    """
+    return [
+        (e, None) if isinstance(e, str) else (e[0], e[1])
+        for e in fs.readdir(path, None)
+    ]
+
+
+def walk(fs, path='/', stat=True):
+    """List ``path`` recursively, like ``ls -lR`` (or ``ls -R`` when ``stat``
+    is ``False``) does.
+    """
+    for name, _ in list_dir(fs, path):
+        if name in ('.', '..'):
+            continue
+        child = path.rstrip('/') + '/' + name
+        node = fs.get_file(child)
+        if stat:
+            fs.getattr(child)
+        yield child
+        if hasattr(node, 'children'):
+            yield from walk(fs, child, stat=stat)
+
+
+def cat(fs, path, size=1024):
+    """Read the entire file at ``path``, ``size`` bytes at a time.
+    """
+    fs.getattr(path)
+    fh = fs.open(path, os.O_RDONLY)
+    try:
+        res = b''
+        while True:
+            data = fs.read(path, size, len(res), fh)
+            if not data:
+                return res
+            res += data
+    finally:
+        fs.release(path, fh)
+
+
+@contextlib.contextmanager
+def timed(label):
+    res = {}
+    start = time.perf_counter()
+    yield res
+    res['time'] = time.perf_counter() - start
+    print('{}: {:.3f}s'.format(label, res['time']))
@@ -0,0 +1,423 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+"""A small stand-in for the CodeGrade API, used by the benchmarks.
+
+It serves a synthetic set of courses, assignments and submissions, can inject
+a fixed latency into every request and counts all requests it handles so that
+benchmarks can assert on the amount of round trips.
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+import collections
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlsplit
+
+CREATED_AT = '2019-01-01T12:00:00.000000'
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer:
+    def __init__(
+        self,
+        latency=0.0,
+        submissions=10,
+        files=3,
+        file_size=64,
+        ranges=True,
+        tree_meta=False,
+    ):
+        self.latency = latency
+        self.ranges = ranges
+        self.tree_meta = tree_meta
+        self.requests = collections.Counter()
+        self.code_bytes = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.user = {'id': 1, 'name': 'Robin', 'username': 'robin'}
+
+        self.courses = []
+        self.submissions = {}
+        self.trees = {}
+        self.contents = {}
+        self.feedbacks = {}
+        self.rubrics = {}
+        self.selected = {}
+        self.assignments = {}
+
+        assignments = []
+        for assig_name in ['Python', 'Shell']:
+            assig = {
+                'id': self._new_id(),
+                'name': assig_name,
+                'created_at': CREATED_AT,
+                'state': 'done',
+                'deadline': CREATED_AT,
+            }
+            self.assignments[assig['id']] = assig
+            assignments.append(assig)
+            self.rubrics[assig['id']] = [
+                self._make_row(
+                    {
+                        'header': 'Style',
+                        'description': 'Is the code readable?',
+                        'items': [
+                            {
+                                'header': 'Bad',
+                                'description': 'Unreadable',
+                                'points': 0,
+                            },
+                            {
+                                'header': 'Good',
+                                'description': 'Readable',
+                                'points': 1,
+                            },
+                        ],
+                    }
+                )
+            ]
+            for i in range(submissions):
+                self._add_submission(assig['id'], i, files, file_size)
+        self.courses.append(
+            {
+                'id': self._new_id(),
+                'name': 'Programmeertalen',
+                'created_at': CREATED_AT,
+                'assignments': assignments,
+            }
+        )
+
+    def _new_id(self):
+        with self._lock:
+            res = self._next_id
+            self._next_id += 1
+        return res
+
+    def _make_row(self, row):
+        row = dict(row, id=row.get('id') or self._new_id())
+        row['items'] = [
+            dict(item, id=item.get('id') or self._new_id())
+            for item in row['items']
+        ]
+        return row
+
+    def _add_submission(self, assignment_id, i, files, file_size):
+        user = {'id': 1000 + i, 'name': 'Student{}'.format(i), 'group': None}
+        sub = {
+            'id': self._new_id(),
+            'assignment_id': assignment_id,
+            'user': user,
+            'assignee': None,
+            'created_at': CREATED_AT,
+            'grade': None,
+            'comment': '',
+        }
+        self.submissions[sub['id']] = sub
+        self.selected[sub['id']] = []
+
+        entries = []
+        for j in range(files):
+            file_id = self._new_id()
+            self.contents[file_id] = (
+                'File {} of {}\n'.format(j, user['name']).encode() *
+                (file_size // 16 + 1)
+            )[:file_size]
+            entries.append({'id': file_id, 'name': 'file{}.py'.format(j)})
+        self.feedbacks[sub['id']] = {
+            'user': {entries[0]['id']: {'1': 'Nice work'}} if files else {},
+            'linter': {},
+        }
+        self.trees[sub['id']] = {
+            'id': self._new_id(),
+            'name': 'top',
+            'entries': entries,
+        }
+
+    def iter_files(self, tree):
+        for entry in tree['entries']:
+            if 'entries' in entry:
+                yield from self.iter_files(entry)
+            else:
+                yield entry
+
+    def find_path(self, submission_id, path):
+        parts = [p for p in path.split('/') if p]
+        node = self.trees[submission_id]
+        for part in parts[1:]:
+            node = [e for e in node['entries'] if e['name'] == part][0]
+        return node
+
+    def render_tree(self, tree):
+        if 'entries' in tree:
+            return dict(
+                tree, entries=[self.render_tree(e) for e in tree['entries']]
+            )
+        elif self.tree_meta:
+            return self.file_meta(tree)
+        return tree
+
+    def file_meta(self, node):
+        size = len(self.contents.get(node['id'], b''))
+        return {
+            'id': node['id'],
+            'name': node['name'],
+            'size': size,
+            'modification_date': 1546344000.0,
+        }
+
+    @property
+    def url(self):
+        return 'http://localhost:{}/api/v1'.format(self._httpd.server_port)
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(
+                        server.max_in_flight, server.in_flight
+                    )
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    server.dispatch(self, method, body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PATCH(self):
+                self._handle('PATCH')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        self._httpd = _Server(('localhost', 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, route=None, method='GET'):
+        if route is None:
+            return sum(self.requests.values())
+        return self.requests[(method, route)]
+
+    def reset_counts(self):
+        self.requests.clear()
+        self.code_bytes = 0
+        self.max_in_flight = 0
+
+    @staticmethod
+    def send(handler, status, body=b'', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        headers = dict(headers or {})
+        if status == 200 and handler.command == 'GET':
+            etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+            headers['ETag'] = etag
+            if handler.headers.get('If-None-Match') == etag:
+                status = 304
+                body = b''
+        handler.send_response(status)
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    ROUTES = [
+        ('login', re.compile(r'^/login$')),
+        ('courses', re.compile(r'^/courses/$')),
+        ('assignment', re.compile(r'^/assignments/(\d+)$')),
+        ('submissions', re.compile(r'^/assignments/(\d+)/submissions/$')),
+        ('assignment_rubric', re.compile(r'^/assignments/(\d+)/rubrics/$')),
+        ('feedbacks', re.compile(r'^/assignments/(\d+)/feedbacks/$')),
+        ('submission', re.compile(r'^/submissions/(\d+)$')),
+        ('files', re.compile(r'^/submissions/(\d+)/files/$')),
+        ('submission_rubric', re.compile(r'^/submissions/(\d+)/rubrics/$')),
+        ('rubricitems', re.compile(r'^/submissions/(\d+)/rubricitems/$')),
+        (
+            'submission_feedbacks',
+            re.compile(r'^/submissions/(\d+)/feedbacks/$')
+        ),
+        ('code', re.compile(r'^/code/(\d+)$')),
+    ]
+
+    def dispatch(self, handler, method, body):
+        url = urlsplit(handler.path)
+        path = url.path[len('/api/v1'):]
+        query = dict(
+            (p.split('=', 1) + [''])[:2] for p in url.query.split('&') if p
+        )
+        for name, regex in self.ROUTES:
+            match = regex.match(path)
+            if match:
+                break
+        else:
+            self.send(handler, 404, {'message': 'Not found'})
+            return
+
+        if name == 'files' and 'path' in query:
+            name = 'file'
+        with self._lock:
+            self.requests[(method, name)] += 1
+
+        args = [int(g) for g in match.groups()]
+        getattr(self, 'route_' + name)(handler, method, body, query, *args)
+
+    def route_login(self, handler, method, body, query):
+        if method == 'POST':
+            self.send(
+                handler, 200, {'user': self.user, 'access_token': 'token'}
+            )
+        else:
+            self.send(handler, 200, self.user)
+
+    def route_courses(self, handler, method, body, query):
+        self.send(handler, 200, self.courses)
+
+    def route_assignment(self, handler, method, body, query, assig_id):
+        if method == 'PATCH':
+            self.assignments[assig_id].update(json.loads(body.decode()))
+            self.send(handler, 204)
+        else:
+            self.send(handler, 200, self.assignments[assig_id])
+
+    def route_submissions(self, handler, method, body, query, assig_id):
+        self.send(
+            handler, 200, [
+                s for s in self.submissions.values()
+                if s['assignment_id'] == assig_id
+            ]
+        )
+
+    def route_assignment_rubric(self, handler, method, body, query, assig_id):
+        if method == 'PUT':
+            self.rubrics[assig_id] = [
+                self._make_row(row)
+                for row in json.loads(body.decode())['rows']
+            ]
+        self.send(handler, 200, self.rubrics[assig_id])
+
+    def route_feedbacks(self, handler, method, body, query, assig_id):
+        self.send(
+            handler, 200, {
+                str(s['id']): self.feedbacks[s['id']]
+                for s in self.submissions.values()
+                if s['assignment_id'] == assig_id
+            }
+        )
+
+    def route_submission(self, handler, method, body, query, sub_id):
+        if method == 'PATCH':
+            self.submissions[sub_id].update(json.loads(body.decode()))
+            self.send(handler, 204)
+        else:
+            self.send(handler, 200, self.submissions[sub_id])
+
+    def route_files(self, handler, method, body, query, sub_id):
+        self.send(handler, 200, self.render_tree(self.trees[sub_id]))
+
+    def route_file(self, handler, method, body, query, sub_id):
+        path = unquote(query['path'])
+        if method == 'POST':
+            parent = self.find_path(sub_id, path.rstrip('/').rsplit('/', 1)[0])
+            name = path.rstrip('/').split('/')[-1]
+            node = {'id': self._new_id(), 'name': name}
+            if path.endswith('/'):
+                node['entries'] = []
+            else:
+                self.contents[node['id']] = body
+            parent['entries'].append(node)
+            self.send(handler, 200, self.file_meta(node))
+        else:
+            node = self.find_path(sub_id, path)
+            self.send(handler, 200, self.file_meta(node))
+
+    def route_submission_rubric(self, handler, method, body, query, sub_id):
+        rubric = self.rubrics[self.submissions[sub_id]['assignment_id']]
+        self.send(
+            handler, 200, {
+                'rubrics': rubric,
+                'selected': self.selected[sub_id],
+            }
+        )
+
+    def route_rubricitems(self, handler, method, body, query, sub_id):
+        ids = set(json.loads(body.decode())['items'])
+        rubric = self.rubrics[self.submissions[sub_id]['assignment_id']]
+        self.selected[sub_id] = [
+            item for row in rubric for item in row['items']
+            if item['id'] in ids
+        ]
+        self.send(handler, 204)
+
+    def route_submission_feedbacks(self, handler, method, body, query, sub_id):
+        self.send(handler, 200, self.feedbacks[sub_id])
+
+    def route_code(self, handler, method, body, query, file_id):
+        content = self.contents[file_id]
+        match = re.match(
+            r'^bytes=(\d+)-(\d+)$',
+            handler.headers.get('Range') or '',
+        )
+        if method == 'GET' and match and self.ranges:
+            start, stop = int(match.group(1)), int(match.group(2)) + 1
+            self.code_bytes += len(content[start:stop])
+            self.send(
+                handler, 206, content[start:stop], {
+                    'Content-Range':
+                        'bytes {}-{}/{}'.format(
+                            start,
+                            min(stop, len(content)) - 1, len(content)
+                        )
+                }
+            )
+        elif method == 'GET':
+            self.code_bytes += len(content)
+            self.send(handler, 200, content)
+        elif method == 'PATCH':
+            new_id = self._new_id()
+            self.contents[new_id] = body
+            for tree in self.trees.values():
+                for entry in self.iter_files(tree):
+                    if entry['id'] == file_id:
+                        entry['id'] = new_id
+            self.send(handler, 200, self.file_meta({'id': new_id, 'name': ''}))
+        else:
+            self.send(handler, 204)
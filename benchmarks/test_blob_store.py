@@ -0,0 +1,78 @@
+import os
+
+from helpers import cat, list_dir
+from stand_in import StandInServer
+from codegra_fs.cache import BlobStore
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def cat_all(fs):
+    res = []
+    for name, _ in list_dir(fs, ASSIGNMENT):
+        if name.startswith('Student'):
+            sub = ASSIGNMENT + '/' + name
+            for f, _ in list_dir(fs, sub):
+                if f.endswith('.py'):
+                    res.append(cat(fs, sub + '/' + f))
+    return res
+
+
+def count_blobs(directory):
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+def test_remount_does_not_download_again(make_fs, tmpdir):
+    with StandInServer(submissions=5, tree_meta=True) as server:
+        store = BlobStore(str(tmpdir), server.url, 2**20)
+        first = cat_all(make_fs(server, blob_store=store))
+        store.close()
+
+        server.reset_counts()
+        store = BlobStore(str(tmpdir), server.url, 2**20)
+        second = cat_all(make_fs(server, blob_store=store))
+        assert first == second
+        assert server.count('code') == 0
+        assert store.stats()['hits'] == len(first)
+        store.close()
+
+
+def test_same_contents_are_stored_once(tmpdir):
+    store = BlobStore(str(tmpdir), 'http://localhost', 2**20)
+    for file_id in range(10):
+        store.set(file_id, b'Starter code\n')
+    store.set(10, b'Something else\n')
+
+    assert count_blobs(store.directory) == 2
+    assert store.get(3) == b'Starter code\n'
+    assert store.stats()['size'] == len(b'Starter code\nSomething else\n')
+
+    for file_id in range(10):
+        store.remove(file_id)
+    assert count_blobs(store.directory) == 1
+    store.close()
+
+
+def test_size_is_bounded(tmpdir):
+    store = BlobStore(str(tmpdir), 'http://localhost', 4 * 1024)
+    for file_id in range(16):
+        store.set(file_id, bytes([file_id]) * 1024)
+
+    assert store.stats()['size'] <= 4 * 1024
+    assert store.get(0) is None
+    assert store.get(15) == bytes([15]) * 1024
+    store.close()
+
+
+def test_corrupt_blobs_are_ignored(tmpdir):
+    store = BlobStore(str(tmpdir), 'http://localhost', 2**20)
+    store.set(1, b'Hello\n')
+    for root, _, files in os.walk(store.directory):
+        for name in files:
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(b'Hel')
+
+    assert store.get(1) is None
+    assert 1 not in store
+    assert count_blobs(store.directory) == 0
+    store.close()
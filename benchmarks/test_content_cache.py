@@ -0,0 +1,72 @@
+import os
+
+from helpers import cat, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def get_files(fs):
+    sub = [
+        ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ][0]
+    return [
+        sub + '/' + name for name, _ in list_dir(fs, sub)
+        if name.endswith('.py')
+    ]
+
+
+def test_reopened_files_are_not_downloaded_again(make_fs):
+    with StandInServer(submissions=1, tree_meta=True) as server:
+        fs = make_fs(server)
+        paths = get_files(fs)
+
+        server.reset_counts()
+        for _ in range(3):
+            for path in paths:
+                assert cat(fs, path) in server.contents.values()
+
+        assert server.count('code') == len(paths)
+        stats = fs.content_cache.stats()
+        assert stats['hits'] == 2 * len(paths)
+        assert abs(stats['hit_rate'] - 2 / 3) < 0.01
+
+
+def test_flush_rekeys_entries(make_fs):
+    with StandInServer(submissions=1, tree_meta=True) as server:
+        fs = make_fs(server)
+        path = get_files(fs)[0]
+        cat(fs, path)
+        old_id = fs.get_file(path).id
+        assert old_id in fs.content_cache
+
+        fh = fs.open(path, os.O_WRONLY)
+        fs.write(path, b'new', 0, fh)
+        fs.flush(path, fh)
+        fs.release(path, fh)
+
+        new_id = fs.get_file(path).id
+        assert new_id != old_id
+        assert old_id not in fs.content_cache
+        assert fs.content_cache.get(new_id) == server.contents[new_id]
+
+        server.reset_counts()
+        assert cat(fs, path) == server.contents[new_id]
+        assert server.count('code') == 0
+
+
+def test_cache_size_is_bounded(make_fs):
+    with StandInServer(submissions=4, tree_meta=True, files=10,
+                       file_size=1024) as server:
+        fs = make_fs(server, content_cache_size=16 * 1024)
+        for name, _ in list_dir(fs, ASSIGNMENT):
+            sub = ASSIGNMENT + '/' + name
+            if name.startswith('Student'):
+                for f, _ in list_dir(fs, sub):
+                    if f.endswith('.py'):
+                        cat(fs, sub + '/' + f)
+
+        stats = fs.content_cache.stats()
+        assert stats['size'] <= 16 * 1024
+        assert stats['evictions'] == 40 - 16
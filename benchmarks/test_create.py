@@ -0,0 +1,62 @@
+import os
+
+from helpers import list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+SCRIPTS = 10
+
+
+def get_submission(fs):
+    sub = [
+        ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ][0]
+    list_dir(fs, sub)
+    return sub
+
+
+def copy_file(fs, path, data):
+    """Copy a file into the mount like ``cp`` does.
+    """
+    fh = fs.create(path, 0o644)
+    fs.write(path, data, 0, fh)
+    fs.flush(path, fh)
+    fs.release(path, fh)
+
+
+def test_new_files_are_created_in_one_request(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server)
+        sub = get_submission(fs)
+        server.reset_counts()
+
+        for i in range(SCRIPTS):
+            copy_file(
+                fs, '{}/grade{}.sh'.format(sub, i),
+                'echo {}\n'.format(i).encode()
+            )
+
+        assert server.count('file', 'POST') == SCRIPTS
+        assert server.count() == SCRIPTS
+        for i in range(SCRIPTS):
+            file = fs.get_file('{}/grade{}.sh'.format(sub, i))
+            assert server.contents[file.id] == 'echo {}\n'.format(i).encode()
+
+
+def test_files_that_are_never_flushed(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server)
+        sub = get_submission(fs)
+        server.reset_counts()
+
+        fh = fs.create(sub + '/tmp.swp', 0o644)
+        fs.write(sub + '/tmp.swp', b'swap', 0, fh)
+        fs.rename(sub + '/tmp.swp', sub + '/renamed.swp')
+        fs.unlink(sub + '/renamed.swp')
+        assert server.count() == 0
+
+        fh = fs.create(sub + '/empty', 0o644)
+        fs.release(sub + '/empty', fh)
+        assert server.count('file', 'POST') == 1
+        assert server.contents[fs.get_file(sub + '/empty').id] == b''
@@ -0,0 +1,72 @@
+import os
+import tracemalloc
+
+from helpers import list_dir
+from stand_in import StandInServer
+
+FILE_SIZE = 32 * 1024 * 1024
+READ_SIZE = 128 * 1024
+
+
+def get_file_path(fs):
+    sub = '/Programmeertalen/Python/' + [
+        n for n, _ in list_dir(fs, '/Programmeertalen/Python')
+        if n.startswith('Student')
+    ][0]
+    path = sub + '/file0.py'
+    fs.getattr(path)
+    return path
+
+
+def read_head(fs, path, size):
+    fh = fs.open(path, os.O_RDONLY)
+    data = fs.read(path, size, 0, fh)
+    fs.release(path, fh)
+    return data
+
+
+def test_read_large_file_bounded_memory(make_fs):
+    with StandInServer(submissions=1, files=1, file_size=FILE_SIZE) as server:
+        fs = make_fs(server)
+        path = get_file_path(fs)
+
+        tracemalloc.start()
+        fh = fs.open(path, os.O_RDONLY)
+        read = 0
+        while True:
+            data = fs.read(path, READ_SIZE, read, fh)
+            if not data:
+                break
+            read += len(data)
+        fs.release(path, fh)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print('Peak traced memory: {:.1f} MiB'.format(peak / 2 ** 20))
+    assert read == FILE_SIZE
+    assert peak < FILE_SIZE / 2
+
+
+def test_read_head_of_large_file(make_fs):
+    with StandInServer(submissions=1, files=1, file_size=FILE_SIZE) as server:
+        fs = make_fs(server)
+        path = get_file_path(fs)
+        server.reset_counts()
+
+        data = read_head(fs, path, 4096)
+
+        print('Transferred {} bytes to read 4096'.format(server.code_bytes))
+        assert len(data) == 4096
+        assert server.count('code') == 1
+        assert server.code_bytes < FILE_SIZE / 64
+
+
+def test_read_head_without_range_support(make_fs):
+    with StandInServer(
+        submissions=1, files=1, file_size=FILE_SIZE, ranges=False
+    ) as server:
+        fs = make_fs(server)
+        path = get_file_path(fs)
+
+        data = read_head(fs, path, 4096)
+        assert data == server.contents[max(server.contents)][:4096]
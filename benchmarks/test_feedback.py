@@ -0,0 +1,31 @@
+from helpers import cat, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def test_feedback_is_requested_per_assignment(make_fs):
+    with StandInServer(submissions=10) as server:
+        fs = make_fs(server)
+        subs = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ]
+        server.reset_counts()
+
+        for sub in subs:
+            assert cat(fs, sub + '/.cg-line-feedback') == (
+                b'/top/file0.py:1:0: Nice work\n'
+            )
+            assert cat(fs, sub + '/.cg-linter-feedback') == b''
+
+        assert server.count('feedbacks') == 1
+        assert server.count('submission_feedbacks') == 0
+        # The files are only requested to load the tree of each submission.
+        assert server.count('files') == len(subs)
+
+        # Listing the submissions afterwards does not request them again.
+        server.reset_counts()
+        for sub in subs:
+            list_dir(fs, sub)
+        assert server.count() == 0
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+from helpers import timed
+from codegra_fs.cgfs import File, Directory
+
+LOOKUPS = 20000
+
+
+def build(fs, name, width, depth):
+    dir = Directory({'id': None, 'name': name}, writable=True)
+    fs.files.insert(dir)
+    path = '/' + name
+    for i in range(depth - 1):
+        child = Directory({'id': None, 'name': 'd{}'.format(i)})
+        dir.insert(child)
+        dir = child
+        path += '/' + child.name
+    for i in range(width):
+        dir.insert(File({'id': i, 'name': 'f{}'.format(i)}))
+    return ['{}/f{}'.format(path, i) for i in range(width)]
+
+
+def time_lookups(fs, paths):
+    paths = [random.choice(paths) for _ in range(LOOKUPS)]
+    with timed('{} lookups of {}'.format(LOOKUPS, paths[0])) as res:
+        for path in paths:
+            fs.get_file(path)
+    return res['time']
+
+
+def test_lookup_cost_width_and_depth(make_fs, server):
+    fs = make_fs(server)
+
+    narrow = time_lookups(fs, build(fs, 'narrow', width=10, depth=3))
+    wide = time_lookups(fs, build(fs, 'wide', width=2000, depth=3))
+    deep = time_lookups(fs, build(fs, 'deep', width=10, depth=30))
+
+    assert wide < narrow * 3
+    # Splitting the path is still linear in its length.
+    assert deep < narrow * 10
+
+
+def test_index_follows_changes(make_fs, server):
+    fs = make_fs(server)
+    build(fs, 'a', width=2, depth=2)
+    index = fs.files.index
+
+    assert index.get(('a', 'd0', 'f1')) is fs.get_file('/a/d0/f1')
+
+    d0 = fs.get_dir('/a').pop('d0')
+    assert index.get(('a', 'd0')) is None
+    assert index.get(('a', 'd0', 'f0')) is None
+    d0.name = 'moved'
+    fs.files.insert(d0)
+    assert index.get(('moved', 'f0')) is d0.children['f0']
+    assert index.get(('moved', 'f1')) is fs.get_file('/moved/f1')
+
+
+def test_missing_paths_are_remembered(make_fs, server):
+    fs = make_fs(server)
+    build(fs, 'a', width=2, depth=1)
+    index = fs.files.index
+
+    with pytest.raises(Exception):
+        fs.get_file('/a/.git')
+    assert index.is_missing(('a', '.git'))
+
+    fs.get_dir('/a').insert(Directory({'id': None, 'name': '.git'}))
+    assert not index.is_missing(('a', '.git'))
+    assert fs.get_dir('/a/.git').name == '.git'
@@ -0,0 +1,45 @@
+import time
+
+from helpers import walk, timed, list_dir
+from stand_in import StandInServer
+from codegra_fs.cache import MetadataCache
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def mount_and_list(make_fs, server, cache_dir):
+    cache = MetadataCache(cache_dir, server.url, server.user['id'])
+    fs = make_fs(server, metadata_cache=cache)
+    return fs, list(walk(fs, ASSIGNMENT, stat=False))
+
+
+def test_cold_and_warm_mount(make_fs, tmpdir):
+    with StandInServer(latency=0.02, submissions=20) as server:
+        with timed('cold mount') as cold:
+            _, cold_paths = mount_and_list(make_fs, server, str(tmpdir))
+        with timed('warm mount') as warm:
+            _, warm_paths = mount_and_list(make_fs, server, str(tmpdir))
+
+    assert sorted(cold_paths) == sorted(warm_paths)
+    assert warm['time'] < cold['time'] / 4
+
+
+def test_warm_mount_applies_changes(make_fs, tmpdir):
+    with StandInServer(submissions=2) as server:
+        mount_and_list(make_fs, server, str(tmpdir))
+
+        assig_id = [
+            a['id'] for a in server.assignments.values()
+            if a['name'] == 'Python'
+        ][0]
+        server._add_submission(assig_id, 99, 1, 64)
+
+        fs, _ = mount_and_list(make_fs, server, str(tmpdir))
+        for _ in range(100):
+            with fs._lock:
+                names = [n for n, _ in list_dir(fs, ASSIGNMENT)]
+            if any(n.startswith('Student99') for n in names):
+                break
+            time.sleep(0.05)
+        else:
+            assert False, 'New submission never appeared'
@@ -0,0 +1,78 @@
+import os
+import time
+
+from helpers import timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+SUBMISSIONS = 20
+WORKERS = 2
+
+
+def wait_for(pred, timeout=10):
+    end = time.time() + timeout
+    while not pred():
+        assert time.time() < end, 'Timed out'
+        time.sleep(0.01)
+
+
+def test_entered_submission_jumps_the_queue(make_fs):
+    with StandInServer(latency=0.05, submissions=SUBMISSIONS) as server:
+        fs = make_fs(
+            server,
+            api_kwargs={'parallel_requests': 8},
+            prefetch_workers=WORKERS,
+        )
+        subs = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ]
+        server.reset_counts()
+
+        # Prefetching all trees takes at least SUBMISSIONS / WORKERS round
+        # trips, entering the last submission should not wait for that.
+        with timed('enter last submission') as res:
+            fs.getattr(subs[-1])
+            names = [name for name, _ in list_dir(fs, subs[-1])]
+        assert 'file0.py' in names
+        assert res['time'] < 0.05 * SUBMISSIONS / WORKERS / 2
+
+        wait_for(lambda: fs.prefetcher.stats().get('pending') == 0)
+        wait_for(lambda: server.count('files') == SUBMISSIONS)
+        assert server.max_in_flight <= WORKERS + 1
+
+        # All other submissions are now available without any request.
+        server.reset_counts()
+        for sub in subs:
+            list_dir(fs, sub)
+        assert server.count() == 0
+
+
+def test_small_contents_are_prefetched(make_fs):
+    with StandInServer(submissions=4, tree_meta=True) as server:
+        fs = make_fs(server, prefetch_workers=WORKERS, prefetch_file_size=64)
+        subs = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ]
+        wait_for(lambda: server.count('code') == len(subs) * 3)
+        wait_for(lambda: fs.prefetcher.stats().get('pending') == 0)
+
+        server.reset_counts()
+        for sub in subs:
+            for name, _ in list_dir(fs, sub):
+                if name.endswith('.py'):
+                    path = sub + '/' + name
+                    fh = fs.open(path, os.O_RDONLY)
+                    data = bytes(fs.read(path, 64, 0, fh))
+                    assert data in server.contents.values()
+                    fs.release(path, fh)
+        assert server.requests == {}, server.requests
+
+
+def test_prefetching_can_be_disabled(make_fs):
+    with StandInServer(submissions=4) as server:
+        fs = make_fs(server, prefetch_workers=0)
+        list_dir(fs, ASSIGNMENT)
+        time.sleep(0.1)
+        assert server.count('files') == 0
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+from helpers import timed, list_dir
+from stand_in import StandInServer
+
+trio = pytest.importorskip('trio')
+pyfuse3 = pytest.importorskip('pyfuse3')
+
+from codegra_fs.pyfuse3_engine import ROOT_INODE, Pyfuse3Operations  # isort:skip
+
+SUBMISSIONS = 8
+
+
+async def lookup(ops, path):
+    inode = ROOT_INODE
+    for part in path.strip('/').split('/'):
+        inode = (await ops.lookup(inode, os.fsencode(part))).st_ino
+    return inode
+
+
+async def read_file(ops, path, results):
+    info = await ops.open(await lookup(ops, path), os.O_RDONLY, None)
+    results.append(await ops.read(info.fh, 0, 1024))
+    await ops.release(info.fh)
+
+
+def test_concurrent_reads(make_fs):
+    with StandInServer(latency=0.02, submissions=SUBMISSIONS) as server:
+        fs = make_fs(server, threaded=True)
+        assig = '/Programmeertalen/Python'
+        paths = [
+            '{}/{}/file0.py'.format(assig, name)
+            for name, _ in list_dir(fs, assig) if name.startswith('Student')
+        ]
+        ops = Pyfuse3Operations(fs)
+        results = []
+
+        async def main():
+            async with trio.open_nursery() as nursery:
+                for path in paths:
+                    nursery.start_soon(read_file, ops, path, results)
+
+        with timed('pyfuse3 engine, {} reads'.format(len(paths))):
+            trio.run(main)
+
+    assert len(results) == SUBMISSIONS
+    assert all(r in server.contents.values() for r in results)
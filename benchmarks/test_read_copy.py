@@ -0,0 +1,52 @@
+import os
+import ctypes
+import tracemalloc
+
+from helpers import timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+FILE_SIZE = 100 * 2**20
+READ_SIZE = 128 * 1024
+
+
+def read_like_fusepy(fs, path, fh):
+    """Read the file sequentially, copying every result into a buffer like
+    fusepy does. Returns the peak of the traced memory in bytes.
+    """
+    kernel_buf = ctypes.create_string_buffer(READ_SIZE)
+    tracemalloc.start()
+    offset = 0
+    while True:
+        ret = fs.read(path, READ_SIZE, offset, fh)
+        if not ret:
+            break
+        ctypes.memmove(kernel_buf, ret, len(ret))
+        offset += len(ret)
+        del ret
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert offset == FILE_SIZE
+    return peak
+
+
+def test_sequential_read_of_cached_file(make_fs):
+    with StandInServer(submissions=1, files=1) as server:
+        fs = make_fs(server, content_cache_size=8 * FILE_SIZE)
+        sub = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ][0]
+        list_dir(fs, sub)
+        path = sub + '/file0.py'
+        fs.getattr(path)
+        fs.content_cache.set(fs.get_file(path).id, b'x' * FILE_SIZE)
+
+        fh = fs.open(path, os.O_RDONLY)
+        with timed('sequential read of cached file'):
+            peak = read_like_fusepy(fs, path, fh)
+        fs.release(path, fh)
+
+    print('Peak traced memory: {:.1f} KiB'.format(peak / 1024))
+    # Copying a slice for every read would allocate at least one read.
+    assert peak < READ_SIZE / 8
@@ -0,0 +1,27 @@
+from helpers import list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def test_readdir_returns_attributes(make_fs):
+    with StandInServer(submissions=10, files=20, tree_meta=True) as server:
+        fs = make_fs(server)
+        subs = [
+            ASSIGNMENT + '/' + n for n, _ in list_dir(fs, ASSIGNMENT)
+            if n.startswith('Student')
+        ]
+        list_dir(fs, subs[0])
+        server.reset_counts()
+
+        # The attributes of all entries are known without any requests.
+        for path in [ASSIGNMENT, subs[0]]:
+            entries = [
+                e for e in list_dir(fs, path) if e[0] not in ('.', '..')
+            ]
+            assert all(attrs is not None for _, attrs in entries)
+            for name, attrs in entries:
+                real = fs.getattr(path + '/' + name)
+                assert attrs['st_mode'] == real['st_mode']
+                assert attrs['st_size'] == real['st_size']
+        assert server.count() == 0
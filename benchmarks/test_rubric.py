@@ -0,0 +1,71 @@
+import os
+
+from helpers import cat, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def write(fs, path, data):
+    fh = fs.open(path, os.O_WRONLY)
+    fs.truncate(path, 0, fh)
+    fs.write(path, data, 0, fh)
+    fs.flush(path, fh)
+    fs.release(path, fh)
+
+
+def get_subs(fs):
+    return [
+        ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ]
+
+
+def test_rubric_is_rendered_once(make_fs):
+    with StandInServer(submissions=10) as server:
+        fs = make_fs(server)
+        subs = get_subs(fs)
+        server.reset_counts()
+
+        datas = [cat(fs, sub + '/.cg-rubric.md') for sub in subs]
+        assert server.count('submission_rubric') == len(subs)
+        assert server.count('assignment_rubric') == 0
+        assert b'- [ ] Bad (0) - Unreadable' in datas[0]
+
+        # All submissions share the same lines of the items.
+        files = [fs.get_file(sub + '/.cg-rubric.md') for sub in subs]
+        assert all(f.lookup is files[0].lookup for f in files)
+
+        path = subs[0] + '/.cg-rubric.md'
+        write(fs, path, datas[0].replace(b'- [ ] Good', b'- [x] Good'))
+        assert b'- [x] Good (1) - Readable' in cat(fs, path)
+        other = cat(fs, subs[1] + '/.cg-rubric.md')
+        assert b'- [ ] Good (1) - Readable' in other
+
+
+def test_rubric_is_invalidated_after_edit(make_fs):
+    with StandInServer(submissions=2) as server:
+        fs = make_fs(server)
+        subs = get_subs(fs)
+        for sub in subs:
+            cat(fs, sub + '/.cg-rubric.md')
+
+        path = ASSIGNMENT + '/.cg-edit-rubric.md'
+        write(fs, path, cat(fs, path).replace(b'Style', b'Layout'))
+
+        for sub in subs:
+            assert b'## Layout\n' in cat(fs, sub + '/.cg-rubric.md')
+
+
+def test_assignment_without_rubric(make_fs):
+    with StandInServer(submissions=2) as server:
+        for assig_id in server.rubrics:
+            server.rubrics[assig_id] = []
+        fs = make_fs(server)
+
+        for sub in get_subs(fs):
+            path = sub + '/.cg-rubric.md'
+            assert cat(fs, path) == (
+                b'# This assignment does not have a rubric!\n'
+            )
+            assert fs.get_file(path).lookup == {}
@@ -0,0 +1,71 @@
+import time
+
+from helpers import cat, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def get_sub(fs):
+    return ASSIGNMENT + '/' + [
+        name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ][0]
+
+
+def test_stale_data_is_refreshed_in_background(make_fs):
+    with StandInServer(latency=0.05, submissions=1) as server:
+        fs = make_fs(
+            server,
+            api_kwargs={'coalesce_window': 0},
+            prefetch_workers=1,
+        )
+        path = get_sub(fs) + '/.cg-grade'
+        file = fs.get_file(path)
+        assert cat(fs, path) == b''
+        mtime = fs.getattr(path)['st_mtime']
+
+        # Refreshing without changes does not change the modification time.
+        file.expires = 0
+        file.metadata.expire()
+        cat(fs, path)
+        end = time.time() + 10
+        while file.is_stale():
+            assert time.time() < end, 'Timed out'
+            time.sleep(0.01)
+        assert fs.getattr(path)['st_mtime'] == mtime
+
+        server.submissions[min(server.submissions)]['grade'] = 8.5
+        file.expires = 0
+        file.metadata.expire()
+
+        # The old data is used without waiting for the server.
+        start = time.time()
+        assert cat(fs, path) == b''
+        assert time.time() - start < 0.05
+
+        end = time.time() + 10
+        while cat(fs, path) == b'':
+            assert time.time() < end, 'Timed out'
+            time.sleep(0.01)
+        assert cat(fs, path) == b'8.5\n'
+        assert fs.getattr(path)['st_mtime'] > mtime
+
+
+def test_invalidate(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server, prefetch_workers=1)
+        sub = get_sub(fs)
+        assert cat(fs, sub + '/.cg-grade') == b''
+        assert cat(fs, sub + '/.cg-linter-feedback') == b''
+
+        sub_id = min(server.submissions)
+        server.submissions[sub_id]['grade'] = 8.5
+        file_id = min(server.contents)
+        server.feedbacks[sub_id]['linter'] = {file_id: {'2': 'Too long'}}
+
+        assert fs.api_handler.ops['invalidate']({}) == {'ok': True}
+        assert cat(fs, sub + '/.cg-grade') == b'8.5\n'
+        assert cat(fs, sub + '/.cg-linter-feedback') == (
+            b'/top/file0.py:2:0: Too long\n'
+        )
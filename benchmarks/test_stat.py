@@ -0,0 +1,74 @@
+import os
+import time
+
+from helpers import cat, walk, timed
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def test_ls_lR_assignment(make_fs):
+    requests = {}
+
+    for tree_meta in [False, True]:
+        with StandInServer(
+            latency=0.01, submissions=10, files=10, tree_meta=tree_meta
+        ) as server:
+            fs = make_fs(server)
+            server.reset_counts()
+            with timed('ls -lR, tree_meta={}'.format(tree_meta)):
+                paths = list(walk(fs, ASSIGNMENT, stat=True))
+            assert len([p for p in paths if p.endswith('.py')]) == 10 * 10
+            requests[tree_meta] = server.count('file')
+
+    print('File metadata requests: {}'.format(requests))
+    assert requests[True] == 0
+    assert requests[False] == 10 * 10
+
+
+def test_ls_la_does_not_request_special_files(make_fs):
+    with StandInServer(submissions=10, tree_meta=True) as server:
+        fs = make_fs(server)
+        list(walk(fs, '/', stat=False))
+        server.reset_counts()
+
+        paths = list(walk(fs, ASSIGNMENT, stat=True))
+        assert server.count() == 0
+
+        # The size is known once a special file has been opened.
+        rubric = [p for p in paths if p.endswith('/.cg-rubric.md')][0]
+        assert fs.getattr(rubric)['st_size'] == 0
+        fh = fs.open(rubric, os.O_RDONLY)
+        size = fs.getattr(rubric, fh)['st_size']
+        fs.release(rubric, fh)
+        assert size > 0
+        assert len(cat(fs, rubric)) == size
+
+
+def test_stale_special_files_are_refreshed_in_background(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(
+            server,
+            api_kwargs={'coalesce_window': 0},
+            prefetch_workers=1,
+        )
+        sub = [
+            p for p in walk(fs, ASSIGNMENT, stat=False)
+            if p.split('/')[-1].startswith('Student')
+        ][0]
+        path = sub + '/.cg-grade'
+        cat(fs, path)
+
+        server.submissions[min(server.submissions)]['grade'] = 8.5
+        file = fs.get_file(path)
+        file.expires = 0
+        file.metadata.expire()
+        server.reset_counts()
+
+        assert fs.getattr(path)['st_size'] == 0
+        end = time.time() + 10
+        while fs.getattr(path)['st_size'] == 0:
+            assert time.time() < end, 'Timed out'
+            time.sleep(0.01)
+        assert server.count('submission') == 1
+        assert cat(fs, path) == b'8.5\n'
@@ -0,0 +1,52 @@
+import os
+
+from helpers import cat, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def get_subs(fs):
+    return [
+        ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ]
+
+
+def test_grade_and_feedback_use_the_submission_list(make_fs):
+    with StandInServer(submissions=10) as server:
+        for sub in server.submissions.values():
+            sub['grade'] = 7.5
+            sub['comment'] = 'Well done'
+
+        fs = make_fs(server, api_kwargs={'coalesce_window': 0})
+        subs = get_subs(fs)
+        server.reset_counts()
+
+        for sub in subs:
+            assert cat(fs, sub + '/.cg-grade') == b'7.5\n'
+            assert cat(fs, sub + '/.cg-feedback') == b'Well done'
+        assert server.count('submission') == 0
+
+        # Refreshing one file refreshes the other too.
+        grade = fs.get_file(subs[0] + '/.cg-grade')
+        server.submissions[grade.submission_id]['comment'] = 'Better'
+        grade.expire()
+        assert cat(fs, subs[0] + '/.cg-grade') == b'7.5\n'
+        assert cat(fs, subs[0] + '/.cg-feedback') == b'Better'
+        assert server.count('submission') == 1
+
+
+def test_changed_grade_is_requested_again(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server, api_kwargs={'coalesce_window': 0})
+        path = get_subs(fs)[0] + '/.cg-grade'
+        assert cat(fs, path) == b''
+
+        fh = fs.open(path, os.O_WRONLY)
+        fs.write(path, b'8\n', 0, fh)
+        fs.flush(path, fh)
+        fs.release(path, fh)
+
+        assert server.count('submission', 'PATCH') == 1
+        assert cat(fs, path) == b'8.0\n'
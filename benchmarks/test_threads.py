@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers import timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+SUBMISSIONS = 8
+ROUNDS = 2
+
+
+def read_submission(fs, sub):
+    res = []
+    for _ in range(ROUNDS):
+        for name, _ in list_dir(fs, sub):
+            if not name.endswith('.py'):
+                continue
+            path = sub + '/' + name
+            fs.getattr(path)
+            fh = fs.open(path, os.O_RDONLY)
+            res.append(bytes(fs.read(path, 1024, 0, fh)))
+            fs.release(path, fh)
+    return res
+
+
+def test_concurrent_reads_across_submissions(make_fs):
+    times = {}
+
+    with StandInServer(latency=0.02, submissions=SUBMISSIONS) as server:
+        for threaded in [False, True]:
+            fs = make_fs(server, threaded=threaded)
+            subs = [
+                ASSIGNMENT + '/' + name
+                for name, _ in list_dir(fs, ASSIGNMENT)
+                if name.startswith('Student')
+            ]
+
+            with timed('threaded={}'.format(threaded)) as res:
+                with ThreadPoolExecutor(SUBMISSIONS) as pool:
+                    results = list(
+                        pool.map(lambda s: read_submission(fs, s), subs)
+                    )
+            times[threaded] = res['time']
+
+            contents = set(server.contents.values())
+            for result in results:
+                assert len(result) == ROUNDS * 3
+                assert all(data in contents for data in result)
+
+    assert times[True] < times[False] / 3
@@ -0,0 +1,41 @@
+from helpers import walk, timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def test_list_full_assignment(make_fs):
+    times = {}
+
+    with StandInServer(latency=0.02, submissions=40) as server:
+        for parallel in [1, 8]:
+            fs = make_fs(
+                server,
+                api_kwargs={'parallel_requests': parallel},
+                prefetch_workers=parallel - 1,
+            )
+            with timed('parallel_requests={}'.format(parallel)) as res:
+                paths = list(walk(fs, ASSIGNMENT, stat=False))
+            times[parallel] = res['time']
+            assert len([p for p in paths if p.endswith('.py')]) == 40 * 3
+
+    assert times[8] < times[1] / 2
+
+
+def test_courses_from_cache_are_not_modified(make_fs):
+    with StandInServer() as server:
+        server.courses.append(
+            dict(server.courses[0], id=server._new_id(), created_at='2019')
+        )
+        fs = make_fs(server)
+        for _ in range(2):
+            fs.files.children_loaded = False
+            fs.load_courses()
+            names = sorted(n for n, _ in list_dir(fs, '/'))
+            assert len(names) == 2
+            assert all(n.startswith('Programmeertalen - ') for n in names)
+
+        import codegra_fs.cgfs as cgfs
+        for course in cgfs.cgapi.get_courses():
+            assert 'dir_name' not in course
+            assert all('dir_name' not in a for a in course['assignments'])
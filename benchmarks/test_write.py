@@ -0,0 +1,61 @@
+from helpers import timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+CHUNK = 128 * 1024
+SIZES = [2**10, 2**20, 10 * 2**20, 100 * 2**20]
+
+
+def write_file(fs, path, size):
+    fh = fs.create(path, 0o644)
+    chunk = b'x' * CHUNK
+    with timed('write {} bytes'.format(size)) as res:
+        for offset in range(0, size, CHUNK):
+            fs.write(path, chunk[:size - offset], offset, fh)
+    assert fs.getattr(path, fh)['st_size'] == size
+    fs.release(path, fh)
+    return res['time']
+
+
+def test_write_scales_linearly(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server)
+        sub = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ][0]
+        list_dir(fs, sub)
+
+        times = {
+            size: write_file(fs, '{}/out{}'.format(sub, size), size)
+            for size in SIZES
+        }
+
+    # Writing ten times as much data should take about ten times as long,
+    # instead of a hundred times as long.
+    assert times[100 * 2**20] < times[10 * 2**20] * 10 * 2.5
+
+
+def test_sparse_writes_and_truncate(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server)
+        sub = [
+            ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+            if name.startswith('Student')
+        ][0]
+        list_dir(fs, sub)
+        path = sub + '/sparse'
+
+        fh = fs.create(path, 0o644)
+        fs.write(path, b'end', 10, fh)
+        assert fs.read(path, 100, 0, fh) == bytes(10) + b'end'
+
+        fs.truncate(path, 4, fh)
+        assert fs.read(path, 100, 0, fh) == bytes(4)
+        fs.truncate(path, 8, fh)
+        assert fs.read(path, 100, 0, fh) == bytes(8)
+        assert fs.getattr(path, fh)['st_size'] == 8
+
+        fs.write(path, b'ab', 1, fh)
+        assert fs.read(path, 100, 0, fh) == b'\0ab' + bytes(5)
+        fs.release(path, fh)
@@ -0,0 +1,84 @@
+import os
+import time
+
+from helpers import cat, timed, list_dir
+from stand_in import StandInServer
+
+ASSIGNMENT = '/Programmeertalen/Python'
+
+
+def get_path(fs):
+    sub = [
+        ASSIGNMENT + '/' + name for name, _ in list_dir(fs, ASSIGNMENT)
+        if name.startswith('Student')
+    ][0]
+    list_dir(fs, sub)
+    return sub + '/file0.py'
+
+
+def save(fs, path, data, times=3):
+    """Save a file like an editor does, flushing it several times.
+    """
+    fs.getattr(path)
+    fh = fs.open(path, os.O_WRONLY)
+    fs.truncate(path, 0, fh)
+    fs.flush(path, fh)
+    fs.write(path, data, 0, fh)
+    for _ in range(times - 1):
+        fs.flush(path, fh)
+    return fh
+
+
+def wait_for_uploads(fs):
+    for _ in range(500):
+        if fs.write_back.pending() == 0:
+            return
+        time.sleep(0.01)
+    assert False, 'Uploads never finished'
+
+
+def test_flushes_are_coalesced(make_fs):
+    with StandInServer(latency=0.05, submissions=1) as server:
+        fs = make_fs(server, write_back_delay=0.2)
+        path = get_path(fs)
+        server.reset_counts()
+
+        with timed('save with write back'):
+            fh = save(fs, path, b'new contents\n')
+            fs.release(path, fh)
+        assert cat(fs, '/.cg-pending-uploads') == b'1\n'
+        assert server.count('code', 'PATCH') == 0
+
+        # Reading the file before it is uploaded gives the new contents.
+        server.reset_counts()
+        assert cat(fs, path) == b'new contents\n'
+        assert server.count() == 0
+
+        wait_for_uploads(fs)
+        assert server.count('code', 'PATCH') == 1
+        assert server.contents[fs.get_file(path).id] == b'new contents\n'
+        assert cat(fs, '/.cg-pending-uploads') == b'0\n'
+
+
+def test_fsync_uploads_immediately(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server, write_back_delay=60)
+        path = get_path(fs)
+        server.reset_counts()
+
+        fh = save(fs, path, b'synced\n')
+        fs.fsync(path, None, fh)
+        assert server.count('code', 'PATCH') == 1
+        assert fs.write_back.pending() == 0
+        assert server.contents[fs.get_file(path).id] == b'synced\n'
+        fs.release(path, fh)
+
+
+def test_flush_all_uploads_everything(make_fs):
+    with StandInServer(submissions=1) as server:
+        fs = make_fs(server, write_back_delay=60)
+        path = get_path(fs)
+
+        fs.release(path, save(fs, path, b'on unmount\n'))
+        fs.write_back.flush_all()
+        assert server.contents[fs.get_file(path).id] == b'on unmount\n'
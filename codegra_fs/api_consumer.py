@@ -23,6 +23,10 @@ def print_usage() -> None:
             '{0} delete-comment FILE LINE_NUMBER\n'
             'OR\n'
             '{0} get-comment FILE\n'
+            'OR\n'
+            '{0} stats DIRECTORY\n'
+            'OR\n'
+            '{0} invalidate DIRECTORY\n'
         ).format(sys.argv[0]),
         file=sys.stderr,
         end='\n',
@@ -119,6 +123,24 @@ def set_comment(s: socket.socket, file: str, line: int, message: str) -> int:
         return 2
 
 
+def get_stats(s: socket.socket) -> int:
+    s.send(bytes(json.dumps({'op': 'get_stats'}).encode('utf8')))
+    out = json_loads(recv(s))
+    if out['ok']:
+        print(json.dumps(out['data'], indent=2, sort_keys=True))
+        return 0
+    else:
+        return 2
+
+
+def invalidate(s: socket.socket) -> int:
+    s.send(bytes(json.dumps({'op': 'invalidate'}).encode('utf8')))
+    if json_loads(recv(s))['ok']:
+        return 0
+    else:
+        return 2
+
+
 def split_path(path: str) -> t.List[str]:
     path = os.path.normpath(os.path.abspath(path))
     res = []  # type: t.List[str]
@@ -201,6 +223,20 @@ def main() -> None:
                 sys.exit(1)
 
             sys.exit(get_comments(s, sys.argv[2]))
+
+        elif sys.argv[1] == 'stats':
+            if len(sys.argv) != 3:
+                print_usage()
+                sys.exit(1)
+
+            sys.exit(get_stats(s))
+
+        elif sys.argv[1] == 'invalidate':
+            if len(sys.argv) != 3:
+                print_usage()
+                sys.exit(1)
+
+            sys.exit(invalidate(s))
         else:
             print_usage()
             sys.exit(1)
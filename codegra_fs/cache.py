@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import os
+import sys
+import json
+import typing as t
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import collections
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+def get_default_cache_dir() -> str:
+    """Get the directory where CGFS should store its caches by default.
+    """
+    if sys.platform.startswith('win32'):
+        base = os.getenv('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform.startswith('darwin'):
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'codegra.fs')
+
+
+class MetadataCache:
+    """A persistent cache of the metadata retrieved from CodeGrade.
+
+    The metadata (courses, submissions and file trees) is stored as JSON in a
+    SQLite database, keyed by the base url of the api and the id of the user,
+    so that different servers and users never see each others data.
+
+    :param directory: The directory in which the database is stored.
+    :param base_url: The base url of the api the data is retrieved from.
+    :param user_id: The id of the user the data is retrieved for.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS metadata (
+            base_url TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (base_url, user_id, key)
+        )
+    '''
+
+    def __init__(self, directory: str, base_url: str, user_id: int) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.base_url = base_url
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, 'metadata.sqlite'),
+            check_same_thread=False,
+        )
+        with self._lock, self._conn:
+            self._conn.execute(self.SCHEMA)
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        """Get the cached value for the given key.
+
+        :param key: The key to get the value for.
+        :returns: The value, or ``None`` if it is not in the cache.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM metadata WHERE base_url = ? AND'
+                ' user_id = ? AND key = ?',
+                (self.base_url, self.user_id, key),
+            ).fetchone()
+        if row is None:
+            return None
+
+        try:
+            return json.loads(row[0])
+        except ValueError:  # pragma: no cover
+            logger.warning('Corrupt cache entry for %s', key)
+            return None
+
+    def set(self, key: str, value: t.Any) -> None:
+        """Store a value in the cache.
+
+        :param key: The key to store the value under.
+        :param value: The value to store, it should be serializable to JSON.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+                (
+                    self.base_url, self.user_id, key, json.dumps(value),
+                    time()
+                ),
+            )
+
+    def clear(self) -> None:
+        """Remove all entries for this server and user.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM metadata WHERE base_url = ? AND user_id = ?',
+                (self.base_url, self.user_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ContentCache:
+    """An in memory cache of the contents of files, keyed by their id.
+
+    The server gives a file a new id every time it is changed, so the contents
+    belonging to an id never change and the cache never needs to check if an
+    entry is still valid. When the cache grows larger than ``max_bytes`` the
+    least recently used contents are evicted. Files larger than a quarter of
+    the cache are never stored, so a single file cannot evict everything.
+
+    :param max_bytes: The maximum amount of bytes stored in the cache.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._contents = collections.OrderedDict(
+        )  # type: collections.OrderedDict[int, bytes]
+        self._stats = collections.Counter()  # type: t.Counter[str]
+
+    @property
+    def max_entry_size(self) -> int:
+        return self.max_bytes // 4
+
+    def __contains__(self, file_id: int) -> bool:
+        with self._lock:
+            return file_id in self._contents
+
+    def get(self, file_id: int) -> t.Optional[bytes]:
+        """Get the contents of a file.
+
+        :param file_id: The id of the file.
+        :returns: The contents, or ``None`` if they are not in the cache.
+        """
+        with self._lock:
+            data = self._contents.get(file_id)
+            if data is None:
+                self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+                self._contents.move_to_end(file_id)
+            return data
+
+    def set(self, file_id: int, data: bytes) -> None:
+        """Store the contents of a file.
+
+        :param file_id: The id of the file.
+        :param data: The contents of the file with this id.
+        """
+        if len(data) > self.max_entry_size:
+            return
+
+        with self._lock:
+            self._pop(file_id)
+            self._contents[file_id] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._contents.popitem(last=False)
+                self.size -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def _pop(self, file_id: int) -> None:
+        old = self._contents.pop(file_id, None)
+        if old is not None:
+            self.size -= len(old)
+
+    def remove(self, file_id: int) -> None:
+        """Remove the contents of a file from the cache.
+
+        :param file_id: The id of the file.
+        """
+        with self._lock:
+            self._pop(file_id)
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            res = dict(self._stats)  # type: t.Dict[str, float]
+            res['hit_rate'] = self._stats['hits'] / lookups if lookups else 0
+            res['entries'] = len(self._contents)
+            res['size'] = self.size
+            return res
+
+
+class BlobStore:
+    """A persistent cache of the contents of files, keyed by their id.
+
+    The contents are stored as files named after their SHA-256 hash, so files
+    with the same contents (which is common for the starter code of an
+    assignment) are stored only once. Which file id has which hash, and when
+    a blob was last used, is stored in a SQLite database. Blobs are written to
+    a temporary file that is renamed when it is complete, and their hash is
+    checked when they are read, so a crash never results in corrupt contents.
+    When the blobs take more than ``max_bytes`` of space the least recently
+    used are removed.
+
+    :param directory: The directory in which the blobs are stored.
+    :param base_url: The base url of the api the files are retrieved from.
+    :param max_bytes: The maximum amount of bytes of all blobs together.
+    """
+    #: Larger files are never stored, as they are read into memory entirely.
+    MAX_ENTRY_SIZE = 32 * 2**20
+
+    SCHEMA = [
+        '''
+        CREATE TABLE IF NOT EXISTS files (
+            base_url TEXT NOT NULL,
+            file_id INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (base_url, file_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT NOT NULL PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''',
+    ]
+
+    def __init__(self, directory: str, base_url: str, max_bytes: int) -> None:
+        self.directory = os.path.join(directory, 'blobs')
+        os.makedirs(self.directory, exist_ok=True)
+        self.base_url = base_url
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()  # type: t.Counter[str]
+        self._conn = sqlite3.connect(
+            os.path.join(directory, 'blobs.sqlite'),
+            check_same_thread=False,
+        )
+        with self._lock, self._conn:
+            for stmt in self.SCHEMA:
+                self._conn.execute(stmt)
+
+    @property
+    def max_entry_size(self) -> int:
+        return min(self.max_bytes // 4, self.MAX_ENTRY_SIZE)
+
+    def __contains__(self, file_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM files WHERE base_url = ? AND file_id = ?',
+                (self.base_url, file_id),
+            ).fetchone() is not None
+
+    def _get_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, file_id: int) -> t.Optional[bytes]:
+        """Get the contents of a file.
+
+        :param file_id: The id of the file.
+        :returns: The contents, or ``None`` if they are not stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT hash FROM files WHERE base_url = ? AND file_id = ?',
+                (self.base_url, file_id),
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            digest = row[0]
+
+            try:
+                with open(self._get_path(digest), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+
+            if data is None or hashlib.sha256(data).hexdigest() != digest:
+                logger.warning('Corrupt blob for file %s', file_id)
+                self._stats['misses'] += 1
+                self._remove_blob(digest)
+                return None
+
+            self._stats['hits'] += 1
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE blobs SET last_used = ? WHERE hash = ?',
+                    (time(), digest),
+                )
+            return data
+
+    def set(self, file_id: int, data: bytes) -> None:
+        """Store the contents of a file.
+
+        :param file_id: The id of the file.
+        :param data: The contents of the file with this id.
+        """
+        if len(data) > self.max_entry_size:
+            return
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._get_path(digest)
+        with self._lock:
+            if not os.path.isfile(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(path), suffix='.tmp'
+                )
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning('Could not store blob: %s', e)
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                    return
+
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)',
+                    (digest, len(data), time()),
+                )
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                    (self.base_url, file_id, digest),
+                )
+            self._evict()
+
+    def remove(self, file_id: int) -> None:
+        """Forget the contents of a file.
+
+        The blob itself is only removed when no other file uses it.
+
+        :param file_id: The id of the file.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT hash FROM files WHERE base_url = ? AND file_id = ?',
+                (self.base_url, file_id),
+            ).fetchone()
+            if row is None:
+                return
+            with self._conn:
+                self._conn.execute(
+                    'DELETE FROM files WHERE base_url = ? AND file_id = ?',
+                    (self.base_url, file_id),
+                )
+            used = self._conn.execute(
+                'SELECT 1 FROM files WHERE hash = ?', (row[0], )
+            ).fetchone()
+            if used is None:
+                self._remove_blob(row[0])
+
+    def _remove_blob(self, digest: str) -> None:
+        with self._conn:
+            self._conn.execute('DELETE FROM files WHERE hash = ?', (digest, ))
+            self._conn.execute('DELETE FROM blobs WHERE hash = ?', (digest, ))
+        try:
+            os.unlink(self._get_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _get_size(self) -> int:
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs'
+                                  ).fetchone()[0]
+
+    def _evict(self) -> None:
+        size = self._get_size()
+        if size <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            'SELECT hash, size FROM blobs ORDER BY last_used'
+        ).fetchall()
+        for digest, blob_size in rows:
+            if size <= self.max_bytes:
+                break
+            self._remove_blob(digest)
+            self._stats['evictions'] += 1
+            size -= blob_size
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._lock:
+            res = dict(self._stats)  # type: t.Dict[str, float]
+            res['size'] = self._get_size()
+            return res
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -2,11 +2,19 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import os
+import random
 import typing as t
+import asyncio
 import logging
+import datetime
+import tempfile
+import threading
+import collections
 from enum import IntEnum
-from time import sleep
+from time import time, sleep
+from email.utils import parsedate_to_datetime
 from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
 import codegra_fs
@@ -15,31 +23,695 @@ DEFAULT_CGAPI_BASE_URL = os.getenv(
     'CGAPI_BASE_URL', 'https://codegra.de/api/v1'
 )
 
-T_CALL = t.TypeVar('T_CALL', bound=t.Callable)
+T = t.TypeVar('T')
 
 USER_AGENT = 'CodeGradeFS/{}'.format(codegra_fs.__version__)
 
 logger = logging.getLogger(__name__)
 
 
-def make_request_method(fun: T_CALL) -> T_CALL:
-    def meth(*args, **kwargs):
+NOT_FOUND = object()
+
+
+class RetryPolicy:
+    """The policy that decides if and when a failed request is retried.
+
+    Only idempotent requests are retried after a connection error, a timeout or
+    a ``502``, ``503`` or ``504`` response, as we cannot know if the server
+    already processed them. Any request is retried if the connection could not
+    be made at all or if the server asked us to slow down with a ``429``
+    response. A ``Retry-After`` header is honoured, otherwise we wait an
+    exponentially growing amount of time with full jitter.
+
+    Retries are limited both per request and per mount: every retry takes a
+    token from a budget that is refilled slowly by successful requests, so an
+    overloaded server is not hammered with retries by every open file.
+
+    :param max_retries: The maximum amount of times a single request is
+        retried.
+    :param backoff: The base delay in seconds of the exponential backoff.
+    :param max_backoff: The maximum delay in seconds before a retry. We give up
+        when the server asks us to wait longer than this.
+    :param budget: The amount of retries that may be done in a row.
+    :param budget_refill: The amount of retries earned by every request that
+        did not need a retry.
+    :param connect_timeout: The timeout in seconds for connecting.
+    :param read_timeout: The timeout in seconds for reading a response without
+        a body.
+    :param min_throughput: The slowest throughput in bytes per second we allow
+        when sending or receiving a body, used to scale the read timeout.
+    """
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        budget: int = 50,
+        budget_refill: float = 0.1,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 3.0,
+        min_throughput: int = 100 * 1024,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.budget_refill = budget_refill
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.min_throughput = min_throughput
+
+        self._lock = threading.Lock()
+        self._tokens = float(budget)
+        self.retries = 0
+        self.give_ups = 0
+
+    def get_timeout(self, size: int = 0) -> t.Tuple[float, float]:
+        """Get the timeout for a request with a body of ``size`` bytes.
+        """
+        return (
+            self.connect_timeout,
+            self.read_timeout + size / self.min_throughput,
+        )
+
+    def _get_retry_after(self,
+                         response: requests.Response) -> t.Optional[float]:
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+
         try:
-            return fun(*args, **kwargs, timeout=3)
-        except requests.exceptions.ConnectionError:
-            try:
-                sleep(1)
-                return fun(*args, **kwargs, timeout=3)
-            except requests.exceptions.ConnectionError as e:
-                raise CGAPIException(
-                    {
-                        'message': str(e),
-                        'description': str(e),
-                        'code': 500,
-                    }
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return max(0.0, (date - now).total_seconds())
+
+    def _is_retryable(
+        self,
+        method: str,
+        response: t.Optional[requests.Response],
+        error: t.Optional[Exception],
+    ) -> bool:
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        elif response is not None and response.status_code == 429:
+            return True
+        elif method.upper() not in self.IDEMPOTENT_METHODS:
+            return False
+        elif error is not None:
+            return isinstance(
+                error, (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
                 )
+            )
+        else:
+            assert response is not None
+            return response.status_code in self.RETRY_STATUSES
+
+    def get_delay(
+        self,
+        method: str,
+        attempt: int,
+        response: t.Optional[requests.Response] = None,
+        error: t.Optional[Exception] = None,
+    ) -> t.Optional[float]:
+        """Get the amount of seconds to wait before retrying a request.
+
+        :param method: The HTTP method of the request.
+        :param attempt: The amount of times the request was already retried.
+        :param response: The response of the server, if there was one.
+        :param error: The error raised while doing the request, if any.
+        :returns: The delay before the next attempt, or ``None`` if the request
+            should not be retried.
+        """
+        if not self._is_retryable(method, response, error):
+            with self._lock:
+                self._tokens = min(
+                    float(self.budget), self._tokens + self.budget_refill
+                )
+            return None
+
+        delay = None  # type: t.Optional[float]
+        if response is not None:
+            delay = self._get_retry_after(response)
+        if delay is None:
+            delay = random.uniform(
+                0, min(self.max_backoff, self.backoff * 2 ** attempt)
+            )
+
+        with self._lock:
+            if (
+                attempt >= self.max_retries or self._tokens < 1 or
+                delay > self.max_backoff
+            ):
+                self.give_ups += 1
+                return None
+            self._tokens -= 1
+            self.retries += 1
+
+        return delay
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'give_ups': self.give_ups,
+                'budget_left': self._tokens,
+            }
+
+
+class _CacheEntry:
+    def __init__(
+        self, data: t.Any, etag: t.Optional[str],
+        last_modified: t.Optional[str], expires: float
+    ) -> None:
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def get_validators(self) -> t.Dict[str, str]:
+        res = {}
+        if self.etag is not None:
+            res['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            res['If-Modified-Since'] = self.last_modified
+        return res
+
+
+class ResponseCache:
+    """A bounded LRU cache of decoded JSON responses of GET requests.
+
+    Responses are stored together with their ``ETag`` and ``Last-Modified``
+    validators, so that a next request for the same url can be made
+    conditional. When the server answers with ``304 Not Modified`` the already
+    decoded data is used, which saves both the transfer and the parsing of the
+    response. Responses the server declared fresh with ``Cache-Control:
+    max-age`` are used without any request until they expire.
+
+    The cached data is shared by everybody requesting the same url, so it must
+    not be modified.
+
+    :param max_entries: The maximum amount of responses kept in the cache, the
+        least recently used response is evicted when this is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 2048) -> None:
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict(
+        )  # type: t.MutableMapping[str, _CacheEntry]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
 
-    return t.cast(T_CALL, meth)
+    @staticmethod
+    def _get_max_age(response: requests.Response) -> t.Optional[float]:
+        cache_control = response.headers.get('Cache-Control', '')
+        directives = [d.strip() for d in cache_control.lower().split(',')]
+        if 'no-store' in directives:
+            return None
+        if 'no-cache' in directives:
+            return 0
+        for directive in directives:
+            if directive.startswith('max-age='):
+                try:
+                    return float(directive[len('max-age='):])
+                except ValueError:
+                    pass
+        return 0
+
+    def get(self, url: str) -> t.Optional[_CacheEntry]:
+        """Get the cached entry for ``url``, if there is one.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)  # type: ignore
+                if entry.expires > time():
+                    self.hits += 1
+            return entry
+
+    def revalidated(self, url: str, response: requests.Response) -> None:
+        """Mark the entry for ``url`` as revalidated by a ``304`` response.
+        """
+        max_age = self._get_max_age(response)
+        with self._lock:
+            self.revalidations += 1
+            entry = self._entries.get(url)
+            if entry is not None and max_age is not None:
+                entry.expires = time() + max_age
+
+    def store(self, url: str, response: requests.Response,
+              data: t.Any) -> None:
+        """Store the decoded ``data`` of ``response`` for ``url``.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        max_age = self._get_max_age(response)
+
+        with self._lock:
+            self.misses += 1
+            if max_age is None or (
+                etag is None and last_modified is None and max_age == 0
+            ):
+                self._entries.pop(url, None)
+                return
+
+            self._entries[url] = _CacheEntry(
+                data, etag, last_modified, time() + max_age
+            )
+            self._entries.move_to_end(url)  # type: ignore
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # type: ignore
+                self.evictions += 1
+
+    def expire_all(self) -> None:
+        """Make sure every entry is revalidated before it is used again.
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                entry.expires = 0
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+            }
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None  # type: t.Any
+        self.error = None  # type: t.Optional[Exception]
+        self.done_at = None  # type: t.Optional[float]
+
+
+class SingleFlight:
+    """Merge identical calls that are done at (nearly) the same time.
+
+    The first call for a key does the actual work, calls for the same key that
+    are made while it is in flight, or at most ``window`` seconds after it
+    finished, wait for it and share its result. Failed calls are never reused
+    after they finished.
+
+    :param window: The amount of seconds the result of a finished call is
+        reused.
+    """
+
+    def __init__(self, window: float = 1.0) -> None:
+        self.window = window
+        self._calls = {}  # type: t.Dict[t.Hashable, _Call]
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.saved = 0
+
+    def do(self, key: t.Hashable, fun: t.Callable[[], T]) -> T:
+        now = time()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and (
+                call.done_at is None or now - call.done_at < self.window
+            ):
+                self.saved += 1
+                leader = False
+            else:
+                self._calls = {
+                    k: c
+                    for k, c in self._calls.items()
+                    if c.done_at is None or now - c.done_at < self.window
+                }
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fun()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.done_at = time()
+            call.event.set()
+
+        return call.result
+
+    def forget_all(self) -> None:
+        """Make sure no call that started before now is reused.
+        """
+        with self._lock:
+            self._calls = {}
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._lock:
+            return {'calls': self.calls, 'saved': self.saved}
+
+
+class FileDownload:
+    """The download of a file, streamed into a spooled temporary file.
+
+    The body of the response is read by a background thread, so the first
+    bytes of the file can be read before the download has finished. Only the
+    first ``max_memory`` bytes are kept in memory, the rest of the file is
+    spooled to disk.
+
+    :param response: The streaming response of the download.
+    :param max_memory: The maximum amount of bytes kept in memory.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self, response: requests.Response, max_memory: int = 8 * 1024 * 1024
+    ) -> None:
+        self._response = response
+        self._spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.size = 0
+        self.done = False
+        self.error = None  # type: t.Optional[Exception]
+
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self) -> None:
+        try:
+            for chunk in self._response.iter_content(self.CHUNK_SIZE):
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._spool.seek(self.size)
+                    self._spool.write(chunk)
+                    self.size += len(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            logger.debug('Download failed: %s', e)
+            self.error = e
+        finally:
+            self._response.close()
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def _wait_for(self, end: t.Optional[int]) -> None:
+        while not self.done and (end is None or self.size < end):
+            self._cond.wait()
+
+        if self.error is not None and (end is None or self.size < end):
+            raise CGAPIException(
+                {
+                    'message': 'Downloading the file failed',
+                    'description': str(self.error),
+                    'code': 500,
+                }
+            )
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Read ``size`` bytes at ``offset``, waiting until they are
+        downloaded.
+        """
+        with self._cond:
+            self._wait_for(offset + size)
+            self._spool.seek(offset)
+            return self._spool.read(max(0, min(size, self.size - offset)))
+
+    def read_all(self) -> bytes:
+        """Wait until the download is finished and return the entire file.
+        """
+        with self._cond:
+            self._wait_for(None)
+            self._spool.seek(0)
+            return self._spool.read()
+
+    def get_complete(self) -> t.Optional[bytes]:
+        """Get the entire file if it is already downloaded.
+
+        :returns: The file, or ``None`` if the download is not finished.
+        """
+        with self._cond:
+            if not self.done or self.error is not None or self._closed:
+                return None
+            self._spool.seek(0)
+            return self._spool.read()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._spool.close()
+
+
+class RangeReader:
+    """Read a file on the server using ranged GET requests.
+
+    Only the parts of the file that are actually read are fetched. When reads
+    are sequential we read ahead, doubling the amount read ahead after every
+    request. Missing ranges that are close to each other are merged into a
+    single request. If the server ignores the ``Range`` header the entire file
+    is downloaded, and used for all subsequent reads.
+
+    :param api: The api used to fetch the ranges.
+    :param file_id: The id of the file to read.
+    :param size: The size of the file.
+    """
+    MIN_READ_AHEAD = 128 * 1024
+    MAX_READ_AHEAD = 8 * 1024 * 1024
+    MERGE_DISTANCE = 64 * 1024
+
+    def __init__(
+        self,
+        api: 'CGAPI',
+        file_id: int,
+        size: int,
+        max_memory: int = 8 * 1024 * 1024
+    ) -> None:
+        self._api = api
+        self._file_id = file_id
+        self.size = size
+        self._spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._extents = []  # type: t.List[t.Tuple[int, int]]
+        self._download = None  # type: t.Optional[FileDownload]
+        self._next_offset = 0
+        self._read_ahead = self.MIN_READ_AHEAD
+        self.bytes_requested = 0
+        self.bytes_transferred = 0
+
+    def _get_missing(self, start: int,
+                     stop: int) -> t.List[t.Tuple[int, int]]:
+        missing = []  # type: t.List[t.List[int]]
+        for ext_start, ext_stop in self._extents + [(stop, stop)]:
+            if ext_stop <= start:
+                continue
+            if ext_start > start:
+                gap_stop = min(ext_start, stop)
+                if missing and start - missing[-1][1] < self.MERGE_DISTANCE:
+                    missing[-1][1] = gap_stop
+                else:
+                    missing.append([start, gap_stop])
+            start = max(start, ext_stop)
+            if start >= stop:
+                break
+        return [(a, b) for a, b in missing]
+
+    def _add_extent(self, start: int, stop: int) -> None:
+        res = []  # type: t.List[t.Tuple[int, int]]
+        for ext_start, ext_stop in sorted(self._extents + [(start, stop)]):
+            if res and ext_start <= res[-1][1]:
+                res[-1] = (res[-1][0], max(res[-1][1], ext_stop))
+            else:
+                res.append((ext_start, ext_stop))
+        self._extents = res
+
+    def _fetch(self, start: int, stop: int) -> bool:
+        r = self._api.get_file_range(self._file_id, start, stop)
+        if r.status_code != 206:
+            logger.debug(
+                'Server ignored range request for file %s', self._file_id
+            )
+            self._download = FileDownload(r)
+            self.bytes_transferred += self.size
+            return False
+
+        self._spool.seek(start)
+        end = start
+        for chunk in r.iter_content(FileDownload.CHUNK_SIZE):
+            self._spool.write(chunk)
+            end += len(chunk)
+        r.close()
+        self._add_extent(start, end)
+        self.bytes_transferred += end - start
+        return True
+
+    def _ensure(self, start: int, stop: int) -> bool:
+        for gap_start, gap_stop in self._get_missing(start, stop):
+            if not self._fetch(gap_start, gap_stop):
+                return False
+        return True
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Read ``size`` bytes at ``offset``, fetching them if needed.
+        """
+        if self._download is not None:
+            return self._download.read(offset, size)
+
+        stop = min(offset + size, self.size)
+        if offset >= stop:
+            return b''
+        self.bytes_requested += stop - offset
+
+        sequential = offset == self._next_offset
+        self._next_offset = stop
+        if not sequential:
+            self._read_ahead = self.MIN_READ_AHEAD
+
+        if self._get_missing(offset, stop):
+            fetch_stop = stop
+            if sequential:
+                fetch_stop = min(self.size, stop + self._read_ahead)
+                self._read_ahead = min(
+                    self.MAX_READ_AHEAD, self._read_ahead * 2
+                )
+            if not self._ensure(offset, fetch_stop):
+                return self._download.read(offset, size)  # type: ignore
+
+        self._spool.seek(offset)
+        return self._spool.read(stop - offset)
+
+    def read_all(self) -> bytes:
+        """Get the entire file, fetching everything that is still missing.
+        """
+        if self._download is None and self._ensure(0, self.size):
+            self._spool.seek(0)
+            return self._spool.read(self.size)
+        assert self._download is not None
+        return self._download.read_all()
+
+    def get_complete(self) -> t.Optional[bytes]:
+        """Get the entire file if all of it is already fetched.
+
+        :returns: The file, or ``None`` if parts of it are still missing.
+        """
+        if self._download is not None:
+            return self._download.get_complete()
+        if self._get_missing(0, self.size):
+            return None
+        self._spool.seek(0)
+        return self._spool.read(self.size)
+
+    def close(self) -> None:
+        logger.debug(
+            'Transferred %d bytes of file %s to read %d bytes',
+            self.bytes_transferred,
+            self._file_id,
+            self.bytes_requested,
+        )
+        if self._download is not None:
+            self._download.close()
+        self._spool.close()
+
+
+class RequestsTransport:
+    """Send requests synchronously on the thread that calls the API.
+    """
+    concurrent = False
+
+    def __init__(self, session: requests.Session) -> None:
+        self.session = session
+
+    def request(self, method: str, url: str,
+                **kwargs: t.Any) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def submit(self, fun: t.Callable[..., T], *args: t.Any) -> 'Future[T]':
+        future = Future()  # type: Future[T]
+        try:
+            future.set_result(fun(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncTransport(RequestsTransport):
+    """Send requests from an asyncio event loop running in the background.
+
+    Calls submitted to this transport are scheduled by the event loop on a pool
+    of ``max_in_flight`` worker threads, so many requests can be in flight at
+    the same time. A request done from any other thread (e.g. the FUSE thread)
+    is submitted to the loop and awaited, a request done by a submitted call is
+    simply done on the worker it is already running on.
+    """
+    concurrent = True
+
+    def __init__(self, session: requests.Session, max_in_flight: int) -> None:
+        super().__init__(session)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_in_flight)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_in_flight)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _call(self, fun: t.Callable[..., T], args: t.Sequence[t.Any]) -> T:
+        self._local.in_pool = True
+        return fun(*args)
+
+    async def _run(self, fun: t.Callable[..., T],
+                   args: t.Sequence[t.Any]) -> T:
+        return await self._loop.run_in_executor(
+            self._pool, self._call, fun, args
+        )
+
+    def request(self, method: str, url: str,
+                **kwargs: t.Any) -> requests.Response:
+        send = super().request
+        if getattr(self._local, 'in_pool', False):
+            return send(method, url, **kwargs)
+        return self.submit(lambda: send(method, url, **kwargs)).result()
+
+    def submit(self, fun: t.Callable[..., T], *args: t.Any) -> 'Future[T]':
+        return asyncio.run_coroutine_threadsafe(
+            self._run(fun, args), self._loop
+        )
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._pool.shutdown(wait=False)
+        super().close()
 
 
 class APIRoutes():
@@ -169,16 +841,21 @@ class APICodes(IntEnum):
 
 class CGAPIException(Exception):
     def __init__(self, response):
-        try:
-            data = response.json()
-        except:
-            raise Exception(
-                'Could not get json from server, maybe wrong url? Url should'
-                ' end with "/api/v1/" and start with "https://"'
-            )
+        if isinstance(response, dict):
+            data = response
+            status_code = data['code']
+        else:
+            try:
+                data = response.json()
+            except:
+                raise Exception(
+                    'Could not get json from server, maybe wrong url? Url'
+                    ' should end with "/api/v1/" and start with "https://"'
+                )
+            status_code = response.status_code
         super().__init__(data['message'])
 
-        self.status_code = response.status_code
+        self.status_code = status_code
         self.description = data['description']
         self.message = data['message']
         self.code = data['code']
@@ -195,8 +872,15 @@ class CGAPI():
         routes: APIRoutes,
         user: t.Mapping,
         access_token: str,
+        parallel_requests: int = 1,
+        retry_policy: t.Optional[RetryPolicy] = None,
+        response_cache_size: int = 2048,
+        coalesce_window: float = 1.0,
     ) -> None:
         self.routes = routes
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.response_cache = ResponseCache(response_cache_size)
+        self.single_flight = SingleFlight(coalesce_window)
         self.user = user
         self.access_token = access_token
 
@@ -207,15 +891,22 @@ class CGAPI():
                 'User-Agent': USER_AGENT,
             }
         )
-        self.s.get = make_request_method(self.s.get)  # type: ignore
-        self.s.patch = make_request_method(self.s.patch)  # type: ignore
-        self.s.post = make_request_method(self.s.post)  # type: ignore
-        self.s.delete = make_request_method(self.s.delete)  # type: ignore
-        self.s.put = make_request_method(self.s.put)  # type: ignore
+
+        if parallel_requests > 1:
+            self.transport = AsyncTransport(
+                self.s, parallel_requests
+            )  # type: RequestsTransport
+        else:
+            self.transport = RequestsTransport(self.s)
 
     @classmethod
     def from_username_and_password(
-        cls, username: str, password: str, base: str, fixed: bool = False
+        cls,
+        username: str,
+        password: str,
+        base: str,
+        fixed: bool = False,
+        **kwargs: t.Any
     ) -> 'CGAPI':
         routes = APIRoutes(base, fixed)
 
@@ -234,11 +925,15 @@ class CGAPI():
         except:
             raise CGAPIException(r)
 
-        return cls(routes, json['user'], json['access_token'])
+        return cls(routes, json['user'], json['access_token'], **kwargs)
 
     @classmethod
     def from_access_token(
-        cls, access_token: str, base: str, fixed: bool = False
+        cls,
+        access_token: str,
+        base: str,
+        fixed: bool = False,
+        **kwargs: t.Any
     ) -> 'CGAPI':
         routes = APIRoutes(base, fixed)
 
@@ -256,7 +951,117 @@ class CGAPI():
         except:
             raise CGAPIException(r)
 
-        return cls(routes, user, access_token)
+        return cls(routes, user, access_token, **kwargs)
+
+    def submit(self, fun: t.Callable[..., T], *args: t.Any) -> 'Future[T]':
+        """Call ``fun`` with ``args`` without waiting for it to finish.
+
+        If the transport does not support concurrent requests the call is done
+        immediately and an already finished future is returned.
+        """
+        return self.transport.submit(fun, *args)
+
+    def close(self) -> None:
+        self.transport.close()
+
+    def stats(self) -> t.Dict[str, t.Dict[str, float]]:
+        return {
+            'retry_policy': self.retry_policy.stats(),
+            'response_cache': self.response_cache.stats(),
+            'single_flight': self.single_flight.stats(),
+        }
+
+    def expire_cache(self) -> None:
+        """Make sure no response that was received before now is used
+        without asking the server if it is still valid.
+        """
+        self.response_cache.expire_all()
+        self.single_flight.forget_all()
+
+    def _request(
+        self, method: str, url: str, size: int = 0, **kwargs: t.Any
+    ) -> requests.Response:
+        """Do a request, retrying it when :attr:`retry_policy` allows it.
+
+        :param size: The expected size of the body that is sent or received,
+            used to determine the timeout of the request.
+        """
+        if method != 'GET':
+            # The request might change the data of cached responses.
+            self.expire_cache()
+
+        data = kwargs.get('data')
+        if isinstance(data, bytes):
+            size = max(size, len(data))
+        timeout = self.retry_policy.get_timeout(size)
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.transport.request(
+                    method, url, timeout=timeout, **kwargs
+                )
+            except requests.exceptions.RequestException as e:
+                delay = self.retry_policy.get_delay(method, attempt, error=e)
+                if delay is None:
+                    raise CGAPIException(
+                        {
+                            'message': str(e),
+                            'description': str(e),
+                            'code': 500,
+                        }
+                    )
+            else:
+                delay = self.retry_policy.get_delay(
+                    method, attempt, response=response
+                )
+                if delay is None:
+                    return response
+
+            logger.debug(
+                'Retrying %s %s in %.2f seconds', method, url, delay
+            )
+            if response is not None:
+                response.close()
+            sleep(delay)
+            attempt += 1
+
+    def _get_json(self, url: str, not_found: t.Any = NOT_FOUND) -> t.Any:
+        """Get the decoded JSON response of a GET request to ``url``.
+
+        Identical requests done at the same time, or shortly after each other,
+        are merged into one request by :attr:`single_flight`. The request is
+        made conditional if the response is in the :attr:`response_cache`. The
+        returned data may be shared with other callers, so it must not be
+        modified.
+
+        :param not_found: The value to return when the server responds with a
+            404, by default a :class:`CGAPIException` is raised.
+        """
+        return self.single_flight.do(
+            ('GET', url), lambda: self._get_json_uncoalesced(url, not_found)
+        )
+
+    def _get_json_uncoalesced(self, url: str, not_found: t.Any) -> t.Any:
+        entry = self.response_cache.get(url)
+        if entry is not None and entry.expires > time():
+            return entry.data
+
+        headers = {} if entry is None else entry.get_validators()
+        r = self._request('GET', url, headers=headers)
+
+        if r.status_code == 304 and entry is not None:
+            self.response_cache.revalidated(url, r)
+            return entry.data
+        elif r.status_code == 404 and not_found is not NOT_FOUND:
+            return not_found
+
+        self._handle_response_error(r)
+
+        data = r.json()
+        self.response_cache.store(url, r, data)
+        return data
 
     @staticmethod
     def _handle_response_error(request):
@@ -264,41 +1069,25 @@ class CGAPI():
             raise CGAPIException(request)
 
     def get_courses(self):
-        r = self.s.get(self.routes.get_courses())
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(self.routes.get_courses())
 
     def get_submissions(self, assignment_id, latest_only=False):
         url = self.routes.get_submissions(
             assignment_id=assignment_id, latest_only=latest_only
         )
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def get_submission_files(self, submission_id):
         url = self.routes.get_files(submission_id=submission_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def get_file_meta(self, submission_id, path):
         url = self.routes.get_file(submission_id=submission_id, path=path)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def create_file(self, submission_id, path, buf=None):
         url = self.routes.get_file(submission_id=submission_id, path=path)
-        r = self.s.post(url, data=buf)
+        r = self._request('POST', url, data=buf)
 
         self._handle_response_error(r)
 
@@ -306,23 +1095,57 @@ class CGAPI():
 
     def rename_file(self, file_id, new_path):
         url = self.routes.get_file_rename(file_id=file_id, new_path=new_path)
-        r = self.s.patch(url)
+        r = self._request('PATCH', url)
 
         self._handle_response_error(r)
 
         return r.json()
 
-    def get_file(self, file_id: int) -> bytes:
+    def get_file(self, file_id: int, size: int = 0) -> bytes:
         url = self.routes.get_file_buf(file_id=file_id)
-        r = self.s.get(url)
+        r = self._request('GET', url, size=size)
 
         self._handle_response_error(r)
 
         return r.content
 
+    def stream_file(self, file_id: int) -> FileDownload:
+        """Start downloading the file with the given id.
+        """
+        url = self.routes.get_file_buf(file_id=file_id)
+        # The timeout applies to every read of the body separately, so it
+        # should not be scaled with the size of the file.
+        r = self._request('GET', url, stream=True)
+
+        self._handle_response_error(r)
+
+        return FileDownload(r)
+
+    def get_file_range(
+        self, file_id: int, start: int, stop: int
+    ) -> requests.Response:
+        """Request the bytes from ``start`` up to ``stop`` of a file.
+
+        The response is streamed, as the server might ignore the range and
+        return the entire file. In that case the status code of the response
+        is 200 instead of 206.
+        """
+        url = self.routes.get_file_buf(file_id=file_id)
+        r = self._request(
+            'GET',
+            url,
+            size=stop - start,
+            stream=True,
+            headers={'Range': 'bytes={}-{}'.format(start, stop - 1)},
+        )
+
+        self._handle_response_error(r)
+
+        return r
+
     def patch_file(self, file_id: int, buf: bytes) -> t.Dict[str, t.Any]:
         url = self.routes.get_file_buf(file_id=file_id)
-        r = self.s.patch(url, data=buf)
+        r = self._request('PATCH', url, data=buf)
 
         self._handle_response_error(r)
 
@@ -330,98 +1153,65 @@ class CGAPI():
 
     def delete_file(self, file_id):
         url = self.routes.get_file_buf(file_id=file_id)
-        r = self.s.delete(url)
+        r = self._request('DELETE', url)
 
         self._handle_response_error(r)
 
     def get_assignment_rubric(self, assignment_id):
         url = self.routes.get_assignment_rubric(assignment_id)
-        r = self.s.get(url)
-        if r.status_code == 404:
-            return []
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url, not_found=[])
 
     def set_assignment_rubric(self, assignment_id, rub):
         url = self.routes.get_assignment_rubric(assignment_id)
-        r = self.s.put(url, json=rub)
+        r = self._request('PUT', url, json=rub)
         self._handle_response_error(r)
 
     def get_submission_rubric(self, submission_id):
         url = self.routes.get_submission_rubric(submission_id)
-        r = self.s.get(url)
-
-        if r.status_code == 404:
-            return {'rubrics': [], 'selected': []}
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url, not_found={'rubrics': [], 'selected': []})
 
     def select_rubricitems(self, submission_id, items):
         url = self.routes.select_rubricitems(submission_id)
-        r = self.s.patch(url, json={'items': items})
+        r = self._request('PATCH', url, json={'items': items})
         self._handle_response_error(r)
 
     def get_submission_feedbacks(self, submission_id):
         url = self.routes.get_submission_feedbacks(submission_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def get_feedbacks(self, assignment_id):
         url = self.routes.get_feedbacks(assignment_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def add_feedback(self, file_id, line, message):
         url = self.routes.add_feedback(file_id, line)
-        r = self.s.put(url, json={'comment': message})
+        r = self._request('PUT', url, json={'comment': message})
 
         self._handle_response_error(r)
 
     def delete_feedback(self, file_id, line):
         url = self.routes.delete_feedback(file_id=file_id, line=line)
-        r = self.s.delete(url)
+        r = self._request('DELETE', url)
 
         self._handle_response_error(r)
 
     def get_feedback(self, file_id):
         url = self.routes.get_feedback(file_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def get_assignment(self, assignment_id):
         url = self.routes.get_assignment(assignment_id=assignment_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def set_assignment(self, assignment_id, settings):
         url = self.routes.get_assignment(assignment_id=assignment_id)
-        r = self.s.patch(url, json=settings)
+        r = self._request('PATCH', url, json=settings)
 
         self._handle_response_error(r)
 
     def get_submission(self, submission_id):
         url = self.routes.get_submission(submission_id)
-        r = self.s.get(url)
-
-        self._handle_response_error(r)
-
-        return r.json()
+        return self._get_json(url)
 
     def set_submission(
         self,
@@ -440,6 +1230,6 @@ class CGAPI():
 
         if feedback is not None:
             d['feedback'] = feedback
-        r = self.s.patch(url, json=d)
+        r = self._request('PATCH', url, json=d)
 
         self._handle_response_error(r)
@@ -14,10 +14,12 @@ import typing as t
 import hashlib
 import logging
 import argparse
-import datetime
 import tempfile
+import functools
 import threading
+import contextlib
 import traceback
+import collections
 from os import O_EXCL, O_CREAT, O_TRUNC, path, getenv
 from enum import IntEnum
 from stat import S_IFDIR, S_IFREG
@@ -28,6 +30,7 @@ from errno import (  # type: ignore
 from getpass import getpass
 from pathlib import Path
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import Future
 
 # codegra_fs.log must be the first one to load, so that other modules
 # will use our custom logging configuration.
@@ -36,7 +39,15 @@ from codegra_fs import log
 if True:
     import codegra_fs
     import codegra_fs.constants as constants
-    from codegra_fs.cgapi import CGAPI, APICodes, CGAPIException
+    import codegra_fs.pyfuse3_engine as pyfuse3_engine
+    from codegra_fs.cache import (
+        BlobStore, ContentCache, MetadataCache, get_default_cache_dir
+    )
+    from codegra_fs.prefetch import Prefetcher
+    from codegra_fs.write_back import WriteBackQueue
+    from codegra_fs.cgapi import (
+        CGAPI, APICodes, RangeReader, FileDownload, CGAPIException
+    )
 
 try:
     import fuse  # type: ignore
@@ -55,6 +66,12 @@ except:
     class LoggingMixIn:  # type: ignore
         pass
 
+    # fusepy might be unavailable when only libfuse 3 is installed, which the
+    # pyfuse3 engine can use.
+    class FuseOSError(OSError):  # type: ignore
+        def __init__(self, errno: int) -> None:
+            super().__init__(errno, os.strerror(errno))
+
 
 try:
     # Python 3.5 doesn't support the syntax below
@@ -75,8 +92,16 @@ try:
 except:
     NoReturn = None  # type: ignore
 
+FileReader = t.Union[RangeReader, FileDownload]
+PathKey = t.Tuple[str, ...]
+Buffer = t.Union[bytes, bytearray]
+# The result of a read, which is either bytes or a ctypes array that supports
+# the buffer protocol.
+ReadBuffer = t.Union[bytes, ctypes.Array]
+DirEntry = t.Union[str, t.Tuple[str, FullStat, int]]
+
 
-class FuseContext:
+class FuseContext(threading.local):
     msg = ''  # type: str
     args = ()  # type: t.Tuple[object, ...]
 
@@ -127,6 +152,48 @@ def create_permission(read: bool, write: bool, execute: bool) -> int:
         return 0 + base * 8 + base * 8 ** 2
 
 
+def write_buffer(buf: bytearray, data: bytes, offset: int) -> None:
+    """Write ``data`` into ``buf`` at ``offset`` in place.
+
+    If ``offset`` is past the end of ``buf`` the gap is filled with zero
+    bytes.
+    """
+    if offset > len(buf):
+        buf.extend(bytes(offset - len(buf)))
+    buf[offset:offset + len(data)] = data
+
+
+def truncate_buffer(buf: bytearray, length: int) -> None:
+    """Truncate ``buf`` to ``length`` in place, or extend it with zero bytes
+    if it is shorter.
+    """
+    if length <= len(buf):
+        del buf[length:]
+    else:
+        buf.extend(bytes(length - len(buf)))
+
+
+def read_buffer(buf: Buffer, offset: int, size: int) -> ReadBuffer:
+    """Get ``size`` bytes at ``offset`` of ``buf``.
+
+    If ``buf`` is a ``bytes`` object the result is a ctypes array pointing
+    into it, so the data is not copied until fusepy (or pyfuse3) copies it to
+    the kernel. A ``bytearray`` can be resized by a write while the result is
+    still in use, so its data is copied.
+    """
+    size = max(0, min(size, len(buf) - offset))
+    if isinstance(buf, bytearray) or size == 0:
+        with memoryview(buf) as view:
+            return bytes(view[offset:offset + size])
+
+    address = ctypes.cast(buf, ctypes.c_void_p).value
+    assert address is not None
+    res = (ctypes.c_char * size).from_address(address + offset)
+    # The array does not keep the bytes it points into alive by itself.
+    res._source = buf  # type: ignore
+    return res
+
+
 def getuid() -> int:
     if sys.platform.startswith('win32'):
         return 0
@@ -176,6 +243,11 @@ class BaseFile:
         self.id = data.get('id', None)
         self.name = name if name is not None else data['name']
         self.stat = None  # type: t.Optional[PartialStat]
+        # The file tree can include the metadata of a file, in which case we
+        # don't have to request it separately.
+        self.meta = (
+            data if 'size' in data and 'modification_date' in data else None
+        )  # type: t.Optional[t.Dict[str, t.Any]]
 
     def getattr(
         self, submission: t.Optional['Directory'] = None, path: str = None
@@ -190,9 +262,11 @@ class BaseFile:
                 'st_gid': getegid(),
             }
 
-            if submission is not None and path is not None:
+            stat = self.meta
+            if stat is None and submission is not None and path is not None:
                 assert cgapi is not None
                 stat = cgapi.get_file_meta(submission.id, path)
+            if stat is not None:
                 self.stat['st_size'] = stat['size']
                 self.stat['st_mtime'] = stat['modification_date']
 
@@ -211,6 +285,52 @@ class BaseFile:
 NOT_PRESENT = object()
 
 
+class PathIndex:
+    """An index of all paths in the file system.
+
+    Next to the nodes at all existing paths it remembers a bounded amount of
+    paths that were found not to exist. Editors and other tools probe a lot of
+    those (``.git``, ``__pycache__``, swap files etc.), and they can now fail
+    without walking the tree. Adding a node at a path removes it from the
+    missing paths.
+
+    :param max_missing: The maximum amount of missing paths to remember.
+    """
+
+    def __init__(self, max_missing: int = 4096) -> None:
+        self.max_missing = max_missing
+        self._lock = threading.Lock()
+        self._nodes = {}  # type: t.Dict[PathKey, BaseFile]
+        self._missing = collections.OrderedDict(
+        )  # type: collections.OrderedDict[PathKey, None]
+
+    def get(self, path: PathKey) -> t.Optional[BaseFile]:
+        return self._nodes.get(path)
+
+    def add(self, path: PathKey, node: BaseFile) -> None:
+        with self._lock:
+            self._nodes[path] = node
+            self._missing.pop(path, None)
+
+    def remove(self, path: PathKey) -> None:
+        with self._lock:
+            self._nodes.pop(path, None)
+
+    def is_missing(self, path: PathKey) -> bool:
+        with self._lock:
+            if path in self._missing:
+                self._missing.move_to_end(path)
+                return True
+            return False
+
+    def add_missing(self, path: PathKey) -> None:
+        with self._lock:
+            self._missing[path] = None
+            self._missing.move_to_end(path)
+            while len(self._missing) > self.max_missing:
+                self._missing.popitem(last=False)
+
+
 class Directory(BaseFile):
     def __init__(
         self,
@@ -228,6 +348,17 @@ class Directory(BaseFile):
         self.stat = None  # type: t.Optional[FullStat]
 
         self.tld = NOT_PRESENT  # type: t.Union[object, str]
+        # The metadata of the submission, only set for submissions.
+        self.metadata = None  # type: t.Optional[SubmissionMetadata]
+        self.files_future = None  # type: t.Optional[Future]
+        # The lock for operations within this directory, only used for
+        # submissions when the file system is running multi threaded.
+        self.lock = threading.RLock()
+
+        # The path of this directory and the index of the file system it is
+        # part of, these are set when it is inserted in an indexed directory.
+        self.path = None  # type: t.Optional[PathKey]
+        self.index = None  # type: t.Optional[PathIndex]
 
     def getattr(
         self,
@@ -241,7 +372,9 @@ class Directory(BaseFile):
                         S_IFDIR | create_permission(
                             read=True, write=self.writable, execute=True
                         ),
-                    **super(Directory, self).getattr(submission, path),
+                    # The size of a directory has no meaning, so we don't
+                    # request the metadata of directories from the server.
+                    **super(Directory, self).getattr(),
                 }
             )
             self.stat['st_nlink'] = 2
@@ -249,13 +382,40 @@ class Directory(BaseFile):
         self.stat['st_atime'] = time()
         return self.stat
 
+    def _index_child(self, file: BaseFile) -> None:
+        assert self.index is not None and self.path is not None
+
+        path = self.path + (file.name, )
+        self.index.add(path, file)
+        if isinstance(file, Directory):
+            file.index = self.index
+            file.path = path
+            for child in file.children.values():
+                file._index_child(child)
+
+    def _unindex_child(self, name: str, file: BaseFile) -> None:
+        assert self.index is not None and self.path is not None
+
+        self.index.remove(self.path + (name, ))
+        if isinstance(file, Directory):
+            for child_name, child in file.children.items():
+                file._unindex_child(child_name, child)
+            file.index = None
+            file.path = None
+
     def insert(self, file: BaseFile) -> None:
         if self.stat is None:
             self.stat = self.getattr()
 
+        old = self.children.get(file.name)
         self.children[file.name] = file
         self.stat['st_nlink'] += 1
 
+        if self.index is not None:
+            if old is not None:
+                self._unindex_child(file.name, old)
+            self._index_child(file)
+
     def pop(self, filename: str) -> BaseFile:
         assert self.stat is not None
 
@@ -266,6 +426,9 @@ class Directory(BaseFile):
             raise FuseOSError(ENOENT)
         self.stat['st_nlink'] -= 1
 
+        if self.index is not None:
+            self._unindex_child(filename, file)
+
         return file
 
     def read(self) -> t.List[str]:
@@ -274,6 +437,10 @@ class Directory(BaseFile):
         return res
 
 
+def _is_dir_of_type(type: DirTypes) -> t.Callable[[BaseFile], bool]:
+    return lambda f: isinstance(f, Directory) and f.type == type
+
+
 class TempDirectory(Directory):
     def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
         super(TempDirectory, self).__init__(*args, **kwargs)
@@ -308,7 +475,7 @@ class SingleFile(BaseFile):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def read(self, offset: int, size: int) -> bytes:
+    def read(self, offset: int, size: int) -> ReadBuffer:
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -347,9 +514,20 @@ class SpecialFile(SingleFile):
     def get_data(self) -> bytes:
         return self.data
 
+    def get_size(self) -> int:
+        """Get the size of this file, which should be done without any
+        requests.
+        """
+        return len(self.get_data())
+
+    def is_stale(self) -> bool:
+        """Check if the data of this file should be refreshed.
+        """
+        return False
+
     def getattr(self, *_: object) -> FullStat:
         return {
-            'st_size': len(self.get_data()),
+            'st_size': self.get_size(),
             'st_atime': self.get_st_atime(),
             'st_mtime': self.get_st_mtime(),
             'st_ctime': self.get_st_ctime(),
@@ -368,8 +546,8 @@ class SpecialFile(SingleFile):
     def get_st_ctime(self) -> float:
         return time()
 
-    def read(self, offset: int, size: int) -> bytes:
-        return self.get_data()[offset:offset + size]
+    def read(self, offset: int, size: int) -> ReadBuffer:
+        return read_buffer(self.get_data(), offset, size)
 
     def release(self) -> None:
         return
@@ -412,6 +590,15 @@ class SocketFile(SpecialFile):
         return self.loc
 
 
+class PendingUploadsFile(SpecialFile):
+    def __init__(self, write_back: WriteBackQueue) -> None:
+        super(PendingUploadsFile, self).__init__(name='.cg-pending-uploads')
+        self.write_back = write_back
+
+    def get_data(self) -> bytes:
+        return '{}\n'.format(self.write_back.pending()).encode()
+
+
 class HelpFile(SpecialFile):
     def __init__(self, from_class: t.Type[SpecialFile]) -> None:
         name = os.path.splitext(from_class.NAME)[0] + '.help'
@@ -433,10 +620,49 @@ class HelpFile(SpecialFile):
         pass
 
 
-def _get_feedbacks(api: CGAPI, submission_id: int,
-                   feedback_type: str) -> t.List[str]:
-    feedbacks = api.get_submission_feedbacks(submission_id)[feedback_type]
-    files = api.get_submission_files(submission_id)
+class AssignmentFeedback:
+    """The line and linter feedback of all submissions of an assignment.
+
+    The feedback is requested for the entire assignment at once, the first
+    time the feedback of any of its submissions is needed.
+
+    :param api: The api to request the feedback with.
+    :param assignment_id: The id of the assignment.
+    """
+
+    def __init__(self, api: CGAPI, assignment_id: int) -> None:
+        self.api = api
+        self.assignment_id = assignment_id
+        self._lock = threading.Lock()
+        self._data = None  # type: t.Optional[t.Dict[str, t.Any]]
+
+    def get(self, submission_id: int, feedback_type: str) -> t.Optional[t.Any]:
+        """Get the feedback of the given type for a submission.
+
+        :param submission_id: The id of the submission.
+        :param feedback_type: The type of feedback, ``'user'`` or
+            ``'linter'``.
+        :returns: The feedback, or ``None`` if the submission was not part of
+            the assignment when the feedback was requested.
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = self.api.get_feedbacks(self.assignment_id)
+            data = self._data
+
+        feedbacks = data.get(str(submission_id))
+        if feedbacks is None:
+            return None
+        return feedbacks.get(feedback_type, {})
+
+    def invalidate(self) -> None:
+        """Make sure the feedback is requested again when it is needed.
+        """
+        with self._lock:
+            self._data = None
+
+
+def _make_file_lookup(files: t.Dict[str, t.Any]) -> t.Dict[str, str]:
     file_lookup = {}
 
     def make_file_lookup(f: t.Dict[str, t.Any], path: str) -> None:
@@ -446,6 +672,35 @@ def _get_feedbacks(api: CGAPI, submission_id: int,
             make_file_lookup(sub, new_path)
 
     make_file_lookup(files, '/')
+    return file_lookup
+
+
+def _get_feedbacks(
+    api: CGAPI,
+    submission_id: int,
+    feedback_type: str,
+    assignment_feedback: t.Optional[AssignmentFeedback] = None,
+    get_file_lookup: t.Optional[t.Callable[[], t.Dict[str, str]]] = None,
+) -> t.List[str]:
+    feedbacks = None
+    if assignment_feedback is not None:
+        feedbacks = assignment_feedback.get(submission_id, feedback_type)
+    if feedbacks is None:
+        feedbacks = api.get_submission_feedbacks(submission_id)[feedback_type]
+
+    if not feedbacks:
+        return []
+    # The feedback can already be formatted by the server.
+    if isinstance(feedbacks, list):
+        return [str(f) for f in feedbacks]
+
+    if get_file_lookup is None:
+        file_lookup = _make_file_lookup(
+            api.get_submission_files(submission_id)
+        )
+    else:
+        file_lookup = get_file_lookup()
+
     res = []
     for file_id, line_feedback in feedbacks.items():
         file_id = str(file_id)
@@ -477,63 +732,135 @@ class ImmutableCachedSpecialFile(SpecialFile):
             self._cached_data = self.get_online_data()
         return self._cached_data
 
+    def get_size(self) -> int:
+        # We report a size of zero until the file is opened, which works as
+        # the file system uses direct io.
+        return 0 if self._cached_data is None else len(self._cached_data)
 
-class LinterFeedbackFile(ImmutableCachedSpecialFile):
-    def __init__(self, api: CGAPI, submission_id: int) -> None:
-        super(LinterFeedbackFile, self).__init__(name='.cg-linter-feedback')
-        self.submission_id = submission_id
-        self.api = api
+    def open(self, data: bytes) -> None:
+        self.get_data()
+
+    def expire(self) -> None:
+        """Make sure the data is requested again before it is used.
+        """
+        self._cached_data = None
 
-    def get_online_data(self) -> bytes:
-        feedback = _get_feedbacks(self.api, self.submission_id, 'linter')
-        if not feedback:
-            return b''
-        return b'\n'.join(f.encode('utf-8') for f in feedback) + b'\n'
 
+class _LineFeedbackFileBase(ImmutableCachedSpecialFile):
+    FEEDBACK_TYPE = ''
 
-class LineFeedbackFile(ImmutableCachedSpecialFile):
-    def __init__(self, api: CGAPI, submission_id: int) -> None:
-        super(LineFeedbackFile, self).__init__(name='.cg-line-feedback')
+    def __init__(
+        self,
+        name: str,
+        api: CGAPI,
+        submission_id: int,
+        assignment_feedback: t.Optional[AssignmentFeedback] = None,
+        get_file_lookup: t.Optional[t.Callable[[], t.Dict[str, str]]] = None,
+    ) -> None:
+        super(_LineFeedbackFileBase, self).__init__(name=name)
         self.submission_id = submission_id
         self.api = api
+        self.assignment_feedback = assignment_feedback
+        self.get_file_lookup = get_file_lookup
+
+    def expire(self) -> None:
+        super(_LineFeedbackFileBase, self).expire()
+        if self.assignment_feedback is not None:
+            self.assignment_feedback.invalidate()
 
     def get_online_data(self) -> bytes:
-        feedback = _get_feedbacks(self.api, self.submission_id, 'user')
+        feedback = _get_feedbacks(
+            self.api,
+            self.submission_id,
+            self.FEEDBACK_TYPE,
+            self.assignment_feedback,
+            self.get_file_lookup,
+        )
         if not feedback:
             return b''
         return b'\n'.join(f.encode('utf-8') for f in feedback) + b'\n'
 
 
+class LinterFeedbackFile(_LineFeedbackFileBase):
+    FEEDBACK_TYPE = 'linter'
+
+    def __init__(
+        self, api: CGAPI, submission_id: int, **kwargs: t.Any
+    ) -> None:
+        super(LinterFeedbackFile, self).__init__(
+            '.cg-linter-feedback', api, submission_id, **kwargs
+        )
+
+
+class LineFeedbackFile(_LineFeedbackFileBase):
+    FEEDBACK_TYPE = 'user'
+
+    def __init__(
+        self, api: CGAPI, submission_id: int, **kwargs: t.Any
+    ) -> None:
+        super(LineFeedbackFile, self).__init__(
+            '.cg-line-feedback', api, submission_id, **kwargs
+        )
+
+
 class CachedSpecialFile(SpecialFile, t.Generic[T]):
-    DELTA = datetime.timedelta(minutes=5)
+    #: The amount of seconds the data of the file is used before it is
+    #: refreshed, subclasses should set this to how often their data changes.
+    TTL = 300.0
 
     def __init__(self, name: str) -> None:
         super(CachedSpecialFile, self).__init__(name=name)
         self.has_data = False
         self.data = b''
-        self.time = datetime.datetime.utcnow() - self.DELTA
+        self.expires = 0.0
         self.mtime = time()
         self.mode = create_permission(True, True, True)
         self.overwrite = False
         self.show_exception = True
+        # Function that refreshes the data in the background, it returns
+        # ``False`` if that is not possible.
+        self.refresher = None  # type: t.Optional[t.Callable[[], bool]]
 
     def get_st_mtime(self) -> float:
         return self.mtime
 
+    def get_size(self) -> int:
+        # The size of the last data we got, which is zero until the file is
+        # opened. This works as the file system uses direct io.
+        return len(self.data)
+
+    def is_stale(self) -> bool:
+        return (
+            self.has_data and not self.overwrite and time() >= self.expires
+        )
+
+    def expire(self) -> None:
+        """Make sure the data is requested again before it is used.
+        """
+        if not self.overwrite:
+            self.has_data = False
+
+    def open(self, data: bytes) -> None:
+        self.get_data()
+
     def get_data(self) -> bytes:
-        if self.has_data and (
-            datetime.datetime.utcnow() - self.time
-        ) < self.DELTA:
+        if self.overwrite or (self.has_data and not self.is_stale()):
             return self.data
-        elif self.overwrite:
-            assert self.has_data
-            return self.data
-
+        elif self.has_data and self.refresher is not None:
+            # Use the old data while it is refreshed.
+            if self.refresher():
+                return self.data
+        return self.refresh()
+
+    def refresh(self) -> bytes:
+        """Get the data from the server, even if it is not stale yet.
+        """
         data = self.get_online_data()
+        # Only tell the user the file changed when the data really changed.
         if data != self.data:
             self.mtime = time() + 1
 
-        self.time = datetime.datetime.utcnow()
+        self.expires = time() + self.TTL
         self.data = data
         self.has_data = True
 
@@ -551,22 +878,16 @@ class CachedSpecialFile(SpecialFile, t.Generic[T]):
     def send_back(self, data: T) -> None:
         raise NotImplementedError
 
+    def _get_buffer(self) -> bytearray:
+        data = self.get_data()
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        self.data = data
+        return data
+
     def write(self, data: bytes, offset: int) -> int:
         self.overwrite = True
-        self.data = self.get_data()
-
-        if offset > len(self.data):
-            self.data += bytes(offset - len(self.data))
-
-        if len(self.data) - offset - len(data) > 0:
-            # Write in between
-            second_offset = offset + len(data)
-            self.data = self.data[:offset] + data + self.data[second_offset:]
-        elif offset == 0:
-            self.data = data
-        else:
-            self.data = self.data[:offset] + data
-
+        write_buffer(self._get_buffer(), data, offset)
         self.has_data = True
         return len(self.data)
 
@@ -612,31 +933,105 @@ class CachedSpecialFile(SpecialFile, t.Generic[T]):
         self.data = self.get_data()
 
     def truncate(self, length: int) -> None:
-        self.data = self.get_data()
+        truncate_buffer(self._get_buffer(), length)
+        self.overwrite = True
 
-        if length == 0:
-            self.data = bytes('', 'utf8')
-        elif length <= len(self.data):
-            self.data = self.data[:length]
-        else:
-            assert self.stat is not None
-            self.data = self.data + bytes(
-                '\0' * (length - self.stat['st_size']), 'utf8'
-            )
 
-        self.overwrite = True
+class SubmissionMetadata:
+    """The metadata of a submission, like its grade, feedback and assignee.
 
+    It starts with the data of the submission in the list of submissions of
+    its assignment, the submission is only requested separately when the
+    data is older than a caller allows. All data is refreshed at once, so
+    reading the grade and the feedback needs at most one request.
 
-class FeedbackFile(CachedSpecialFile):
-    NAME = '.cg-feedback'
+    :param api: The api to request the submission with.
+    :param data: The data of the submission as returned by the server.
+    """
 
-    def __init__(self, api: CGAPI, submission_id: int) -> None:
+    def __init__(self, api: CGAPI, data: t.Dict[str, t.Any]) -> None:
         self.api = api
-        super(FeedbackFile, self).__init__(name=self.NAME)
-        self.submission_id = submission_id
+        self.submission_id = data['id']  # type: int
+        #: Increased every time the data changes.
+        self.version = 0
+        self._lock = threading.Lock()
+        self._data = data
+        self._updated = time()
+
+    def get(self, key: str, max_age: float) -> t.Any:
+        """Get a value of the metadata.
+
+        :param key: The key of the value.
+        :param max_age: The amount of seconds the data may be old, if it is
+            older the submission is requested again.
+        :returns: The value.
+        """
+        with self._lock:
+            if key in self._data and time() - self._updated < max_age:
+                return self._data[key]
+            data = self.api.get_submission(self.submission_id)
+            self._update(data)
+            return data[key]
+
+    def _update(self, data: t.Dict[str, t.Any]) -> None:
+        if data != self._data:
+            self.version += 1
+            self._data = data
+        self._updated = time()
+
+    def update(self, data: t.Dict[str, t.Any]) -> None:
+        """Update the metadata with newer data of the server.
+
+        :param data: The data of the submission as returned by the server.
+        """
+        with self._lock:
+            self._update(data)
+
+    def expire(self) -> None:
+        """Make sure the submission is requested again when the metadata is
+        needed, for example because it was changed.
+        """
+        with self._lock:
+            self._updated = 0.0
+
+
+class _SubmissionMetadataFile(CachedSpecialFile[T]):
+    def __init__(
+        self, name: str, api: CGAPI, metadata: SubmissionMetadata
+    ) -> None:
+        super(_SubmissionMetadataFile, self).__init__(name=name)
+        self.api = api
+        self.metadata = metadata
+        self.submission_id = metadata.submission_id
+        self.version = -1
+
+    def get_data(self) -> bytes:
+        # The metadata can be updated by other files or a newer list of
+        # submissions, which we can use without any requests.
+        if not self.overwrite and self.version != self.metadata.version:
+            self.has_data = False
+        return super(_SubmissionMetadataFile, self).get_data()
+
+    def get_metadata(self, key: str) -> t.Any:
+        res = self.metadata.get(key, self.TTL)
+        self.version = self.metadata.version
+        return res
+
+    def expire(self) -> None:
+        super(_SubmissionMetadataFile, self).expire()
+        self.metadata.expire()
+
+
+class FeedbackFile(_SubmissionMetadataFile):
+    NAME = '.cg-feedback'
+    # The feedback and grade are often changed by other graders.
+    TTL = 30.0
+
+    def __init__(self, api: CGAPI, metadata: SubmissionMetadata) -> None:
+        super(FeedbackFile, self).__init__(self.NAME, api, metadata)
 
     def get_online_data(self) -> bytes:
-        feedback = self.api.get_submission(self.submission_id)['comment']
+        feedback = self.get_metadata('comment')
         if not feedback:
             return b''
         return bytes(feedback, 'utf8')
@@ -646,19 +1041,19 @@ class FeedbackFile(CachedSpecialFile):
 
     def send_back(self, feedback: bytes) -> None:
         self.api.set_submission(self.submission_id, feedback=feedback)
+        self.metadata.expire()
 
 
-class GradeFile(CachedSpecialFile[t.Union[str, float]]):
+class GradeFile(_SubmissionMetadataFile[t.Union[str, float]]):
     NAME = '.cg-grade'
+    TTL = 30.0
 
-    def __init__(self, api: CGAPI, submission_id: int) -> None:
-        self.api = api
+    def __init__(self, api: CGAPI, metadata: SubmissionMetadata) -> None:
         self.grade = None  # type: t.Optional[float]
-        super(GradeFile, self).__init__(name=self.NAME)
-        self.submission_id = submission_id
+        super(GradeFile, self).__init__(self.NAME, api, metadata)
 
     def get_online_data(self) -> bytes:
-        grade = self.api.get_submission(self.submission_id)['grade']
+        grade = self.get_metadata('grade')
 
         if grade is None:
             return b''
@@ -697,32 +1092,70 @@ class GradeFile(CachedSpecialFile[t.Union[str, float]]):
                 return
 
         self.api.set_submission(self.submission_id, grade=grade)
+        self.metadata.expire()
 
 
-class RubricSelectFile(CachedSpecialFile[t.List[str]]):
-    NAME = '.cg-rubric.md'
+class AssignmentRubric:
+    """The rubric of an assignment, shared by the rubric files of the
+    assignment and all its submissions.
 
-    def __init__(self, api: CGAPI, submission_id: int, user: t.Dict) -> None:
-        super(RubricSelectFile, self).__init__(name=self.NAME)
-        self.submission_id = submission_id
-        self.user = user
-        self.lookup = {}  # type: t.Dict[int, str]
-        self.api = api
+    Rendering the rubric for a submission only depends on which items are
+    selected, so the rendered rubric and the line of each item are computed
+    once and reused for all submissions until the rubric changes.
 
-    def get_online_data(self) -> bytes:
-        res = []
-        self.lookup = {}
-        d = self.api.get_submission_rubric(self.submission_id)
-        sel = set(i['id'] for i in d['selected'])
-        l_num = 0
-        if d['rubrics']:
-            res.append('# The rubric of {}\n\n'.format(self.user['name']))
-            l_num += 2
-        else:
-            res.append('# This assignment does not have a rubric!\n')
-            l_num += 1
+    :param api: The api to request the rubric with.
+    :param assignment_id: The id of the assignment.
+    """
+
+    def __init__(self, api: CGAPI, assignment_id: int) -> None:
+        self.api = api
+        self.assignment_id = assignment_id
+        #: Increased every time the rubric changes.
+        self.version = 0
+        self._lock = threading.Lock()
+        self._rows = None  # type: t.Optional[t.List[t.Dict[str, t.Any]]]
+        self._template = None  # type: t.Optional[t.List[t.Optional[str]]]
+        self._item_ids = []  # type: t.List[t.Any]
+        self._lookup = {}  # type: t.Dict[int, t.Any]
+
+    def fetch(self) -> t.List[t.Dict[str, t.Any]]:
+        """Request the rubric from the server and update it.
+
+        :returns: The rows of the rubric.
+        """
+        rows = self.api.get_assignment_rubric(self.assignment_id)
+        self.update(rows)
+        return rows
+
+    def update(self, rows: t.List[t.Dict[str, t.Any]]) -> None:
+        """Update the rubric if the given rows are different.
+
+        :param rows: The rows of the rubric as returned by the server.
+        """
+        with self._lock:
+            if rows == self._rows:
+                return
+            self._rows = rows
+            self._template = None
+            self.version += 1
 
-        for rub in d['rubrics']:
+    def invalidate(self) -> None:
+        """Forget the rubric, for example because it was changed.
+        """
+        with self._lock:
+            self._rows = None
+            self._template = None
+            self.version += 1
+
+    def _make_template(self, rows: t.List[t.Dict[str, t.Any]]) -> None:
+        # The template contains ``None`` at the place of every checkbox, the
+        # first two lines contain the header with the name of the user.
+        res = []  # type: t.List[t.Optional[str]]
+        self._item_ids = []
+        self._lookup = {}
+        l_num = 2
+
+        for rub in rows:
             res.append('## ')
             res.append(rub['header'])
             res.append('\n')
@@ -739,10 +1172,12 @@ class RubricSelectFile(CachedSpecialFile[t.List[str]]):
 
             l_num += 1
 
-            rub['items'].sort(key=lambda i: i['points'])
-            for item in rub['items']:
-                self.lookup[l_num] = item['id']
-                res.append('- [{}] '.format('x' if item['id'] in sel else ' '))
+            for item in sorted(rub['items'], key=lambda i: i['points']):
+                self._lookup[l_num] = item['id']
+                self._item_ids.append(item['id'])
+                res.append('- [')
+                res.append(None)
+                res.append('] ')
                 res.append(item['header'].replace('\n', '\n  '))
                 res.append(' ({}) - '.format(item['points']))
                 res.append(item['description'].replace('\n', '\n  '))
@@ -754,7 +1189,73 @@ class RubricSelectFile(CachedSpecialFile[t.List[str]]):
             res.append('\n')
             l_num += 1
 
-        return bytes(''.join(res[:-1]), 'utf8')
+        self._template = res[:-1]
+
+    def render(
+        self, user: t.Dict[str, t.Any], selected: t.Iterable[t.Any]
+    ) -> t.Tuple[bytes, t.Dict[int, t.Any]]:
+        """Render the rubric for a submission.
+
+        :param user: The user of the submission.
+        :param selected: The ids of the selected items.
+        :returns: The rendered rubric and a mapping from line numbers to the
+            ids of the items on those lines. This mapping should not be
+            modified.
+        """
+        with self._lock:
+            rows = self._rows or []
+            if not rows:
+                return b'# This assignment does not have a rubric!\n', {}
+            if self._template is None:
+                self._make_template(rows)
+            template = self._template
+            item_ids = self._item_ids
+            lookup = self._lookup
+        assert template is not None
+
+        sel = set(selected)
+        marks = iter(['x' if i in sel else ' ' for i in item_ids])
+        res = ['# The rubric of {}\n\n'.format(user['name'])]
+        res.extend(next(marks) if p is None else p for p in template)
+        return bytes(''.join(res), 'utf8'), lookup
+
+
+class RubricSelectFile(CachedSpecialFile[t.List[str]]):
+    NAME = '.cg-rubric.md'
+    TTL = 60.0
+
+    def __init__(
+        self,
+        api: CGAPI,
+        submission_id: int,
+        user: t.Dict,
+        rubric: AssignmentRubric,
+    ) -> None:
+        super(RubricSelectFile, self).__init__(name=self.NAME)
+        self.submission_id = submission_id
+        self.user = user
+        self.lookup = {}  # type: t.Dict[int, str]
+        self.api = api
+        self.rubric = rubric
+        self.version = -1
+
+    def get_data(self) -> bytes:
+        # The lines of the items are no longer correct when the rubric
+        # changed after our data was rendered.
+        if not self.overwrite and self.version != self.rubric.version:
+            self.has_data = False
+        return super(RubricSelectFile, self).get_data()
+
+    def get_online_data(self) -> bytes:
+        # The server has no route for only the selected items, but the rubric
+        # it sends along is only rendered again when it changed.
+        d = self.api.get_submission_rubric(self.submission_id)
+        self.rubric.update(d['rubrics'])
+        self.version = self.rubric.version
+        data, self.lookup = self.rubric.render(
+            self.user, (i['id'] for i in d['selected'])
+        )
+        return data
 
     def parse(self, data: bytes) -> t.List[str]:
         sel = []
@@ -837,11 +1338,16 @@ class RubricEditorFile(CachedSpecialFile[t.List[RubricRow]]):
     NAME = '.cg-edit-rubric.md'
 
     def __init__(
-        self, api: CGAPI, assignment_id: int, append_only: bool = True
+        self,
+        api: CGAPI,
+        assignment_id: int,
+        rubric: AssignmentRubric,
+        append_only: bool = True,
     ) -> None:
         super(RubricEditorFile, self).__init__(name=self.NAME)
         self.api = api
         self.assignment_id = assignment_id
+        self.rubric = rubric
         self.append_only = append_only
         self.lookup = {}  # type: t.Dict[str, int]
 
@@ -854,7 +1360,7 @@ class RubricEditorFile(CachedSpecialFile[t.List[RubricRow]]):
         res = []
         self.lookup = {}
 
-        for rub in self.api.get_assignment_rubric(self.assignment_id):
+        for rub in self.rubric.fetch():
             res.append('# ')
             res.append('[{}] '.format(self.hash_id(rub['id'])))
             res.append(rub['header'])
@@ -868,8 +1374,7 @@ class RubricEditorFile(CachedSpecialFile[t.List[RubricRow]]):
             res.append('-' * 79)
             res.append('\n')
 
-            rub['items'].sort(key=lambda i: i['points'])
-            for item in rub['items']:
+            for item in sorted(rub['items'], key=lambda i: i['points']):
                 res.append('- [{}] '.format(self.hash_id(item['id'])))
                 res.append('({}) '.format(item['points']))
                 res.append(item['header'].replace('\n', '\n  '))
@@ -1065,7 +1570,10 @@ class RubricEditorFile(CachedSpecialFile[t.List[RubricRow]]):
             raise FuseOSError(EPERM)
 
         self.lookup = new_lookup
-        self.api.set_assignment_rubric(self.assignment_id, {'rows': res})
+        try:
+            self.api.set_assignment_rubric(self.assignment_id, {'rows': res})
+        finally:
+            self.rubric.invalidate()
 
 
 class AssignmentSettingsFile(CachedSpecialFile[t.Dict[str, str]]):
@@ -1214,25 +1722,85 @@ class File(SingleFile):
     ) -> None:
         super(File, self).__init__(data, name)
 
-        self._data = None  # type: t.Optional[bytes]
+        self._data = None  # type: t.Optional[Buffer]
+        self._reader = None  # type: t.Optional[FileReader]
         self.dirty = False
+        # The flushed contents that still have to be uploaded, when using a
+        # write back queue.
+        self.pending_data = None  # type: t.Optional[bytes]
         self.stat = None  # type: t.Optional[FullStat]
 
+    def _get_reader(self) -> FileReader:
+        if self._reader is None:
+            assert cgapi is not None
+            if self.stat is None or self.stat['st_size'] is None:
+                try:
+                    self._reader = cgapi.stream_file(self.id)
+                except CGAPIException as e:
+                    handle_cgapi_exception(e)
+            else:
+                self._reader = RangeReader(
+                    cgapi, self.id, self.stat['st_size']
+                )
+        return self._reader
+
+    def _close_reader(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    def get_clean_data(self, max_size: t.Optional[int] = None
+                       ) -> t.Optional[bytes]:
+        """Get the contents of this file if they are equal to those on the
+        server and can be retrieved without doing any requests.
+
+        :param max_size: Only return the contents if they are at most this
+            large.
+        :returns: The contents or ``None``.
+        """
+        if self.dirty or self.pending_data is not None:
+            return None
+        size = None if self.stat is None else self.stat['st_size']
+        if max_size is not None and (size is None or size > max_size):
+            return None
+        if self._data is not None:
+            return bytes(self._data)
+        if self._reader is not None:
+            return self._reader.get_complete()
+        return None
+
     @property
-    def data(self) -> bytes:
+    def data(self) -> Buffer:
         if self._data is None:
-            assert cgapi is not None
-            self._data = cgapi.get_file(self.id)
+            try:
+                self._data = self._get_reader().read_all()
+            except CGAPIException as e:
+                handle_cgapi_exception(e)
+            finally:
+                self._close_reader()
             assert self.stat is not None
             self.stat['st_size'] = len(self._data)
         return self._data
 
     @data.setter
-    def data(self, data: t.Optional[bytes]) -> None:
+    def data(self, data: t.Optional[Buffer]) -> None:
         if data is not None:
             assert self.stat is not None
             self.stat['st_size'] = len(data)
         self._data = data
+        self._close_reader()
+
+    def _get_buffer(self) -> bytearray:
+        # Changes are made in place, so writing a file in many small chunks
+        # does not copy all of it for every chunk.
+        data = self.data
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+            self._data = data
+        return data
 
     def getattr(
         self,
@@ -1255,8 +1823,17 @@ class File(SingleFile):
         assert self.stat is not None
         self.stat['st_atime'] = time()
 
-    def read(self, offset: int, size: int) -> bytes:
-        return self.data[offset:offset + size]
+    def read(self, offset: int, size: int) -> ReadBuffer:
+        if self._data is not None:
+            return read_buffer(self._data, offset, size)
+
+        # Only fetch the parts of the file that are read (if we know its size)
+        # instead of loading it entirely, so we don't need to keep (large)
+        # files in memory and can return data as soon as possible.
+        try:
+            return self._get_reader().read(offset, size)
+        except CGAPIException as e:
+            handle_cgapi_exception(e)
 
     def utimens(self, atime: float, mtime: float) -> None:
         self.setattr('st_atime', atime)
@@ -1270,7 +1847,7 @@ class File(SingleFile):
         assert cgapi is not None
 
         try:
-            res = cgapi.patch_file(self.id, self._data)
+            res = cgapi.patch_file(self.id, bytes(self._data))
         except CGAPIException as e:
             # This is valid as we use a setter
             self.data = None  # type: ignore
@@ -1281,43 +1858,28 @@ class File(SingleFile):
         return res
 
     def release(self) -> None:
-        # This is valid as we use a setter
-        self.data = None  # type: ignore
+        # Keep the contents until they are uploaded, they cannot be retrieved
+        # from the server until then.
+        if self.pending_data is None:
+            # This is valid as we use a setter
+            self.data = None  # type: ignore
 
     def truncate(self, length: int) -> None:
-        old_data = self.data
-
-        if length == 0:
-            self.data = bytes('', 'utf8')
-        elif length <= len(old_data):
-            self.data = self.data[:length]
-        else:
-            self.data = old_data + bytes(
-                '\0' * (length - len(old_data)), 'utf8'
-            )
+        buf = self._get_buffer()
+        truncate_buffer(buf, length)
         assert self.stat is not None
 
+        self.stat['st_size'] = len(buf)
         self.stat['st_atime'] = time()
         self.stat['st_mtime'] = time()
         self.dirty = True
 
     def write(self, data: bytes, offset: int) -> int:
-        old_data = self.data
-
-        if offset > len(old_data):
-            assert self._data is not None
-            self._data += bytes(offset - len(old_data))
-
-        if len(old_data) - offset - len(data) > 0:
-            # Write in between
-            second_offset = offset + len(data)
-            self.data = old_data[:offset] + data + old_data[second_offset:]
-        elif offset == 0:
-            self.data = data
-        else:
-            self.data = self.data[:offset] + data
+        buf = self._get_buffer()
+        write_buffer(buf, data, offset)
 
         assert self.stat is not None
+        self.stat['st_size'] = len(buf)
         self.stat['st_atime'] = time()
         self.stat['st_mtime'] = time()
         self.dirty = True
@@ -1336,6 +1898,8 @@ class APIHandler:
             'get_feedback': self.get_feedback,
             'delete_feedback': self.delete_feedback,
             'is_file': self.is_file,
+            'get_stats': self.get_stats,
+            'invalidate': self.invalidate,
         }  # type: t.Dict[str, APIHandler.ReceiveHandler]
         self.cgfs = cgfs
         self.stop = False
@@ -1351,19 +1915,18 @@ class APIHandler:
         if not data:
             return
 
-        with self.cgfs._lock:
-            data_dict = json.loads(data.decode())
-            op = data_dict['op']
-            if op not in self.ops:
-                conn.send(b'{"ok": false, "error": "unkown op"}')
-            del data_dict['op']
-            payload = data_dict
-            try:
-                res = self.ops[op](payload)
-                conn.send(bytes(json.dumps(res).encode('utf8')))
-            except:
-                logger.debug(traceback.format_exc())
-                conn.send(b'{"ok": false, "error": "Unkown error"}')
+        data_dict = json.loads(data.decode())
+        op = data_dict['op']
+        if op not in self.ops:
+            conn.send(b'{"ok": false, "error": "unkown op"}')
+        del data_dict['op']
+        payload = data_dict
+        try:
+            res = self.ops[op](payload)
+            conn.send(bytes(json.dumps(res).encode('utf8')))
+        except:
+            logger.debug(traceback.format_exc())
+            conn.send(b'{"ok": false, "error": "Unkown error"}')
 
     def run(self, sock: socket.socket) -> None:
         sock.settimeout(1.0)
@@ -1395,7 +1958,8 @@ class APIHandler:
             f_name = ffi.string(out_str[0]).decode('utf-8')
             winfspy.plumbing.lib.FspPosixDeletePath(out_str[0])
         try:
-            return self.cgfs.get_file(f_name, expect_type=SingleFile)
+            with self.cgfs._locked(f_name):
+                return self.cgfs.get_file(f_name, expect_type=SingleFile)
         except:
             return {'ok': False, 'error': 'File ({}) not found'.format(f_name)}
 
@@ -1406,17 +1970,16 @@ class APIHandler:
         line = payload['line']
         assert cgapi is not None
 
-        with self.cgfs._lock:
-            f = self._get_file(payload['file'])
-            if not isinstance(f, SingleFile):
-                return f
+        f = self._get_file(payload['file'])
+        if not isinstance(f, SingleFile):
+            return f
 
-            try:
-                cgapi.delete_feedback(f.id, line)
-            except:
-                return {'ok': False, 'error': 'The server returned an error'}
+        try:
+            cgapi.delete_feedback(f.id, line)
+        except:
+            return {'ok': False, 'error': 'The server returned an error'}
 
-            return {'ok': True}
+        return {'ok': True}
 
     def is_file(self, payload: t.Dict[str, t.Any]) -> APIHandlerResponse:
         f_name = self.cgfs.strippath(payload['file'])
@@ -1433,53 +1996,76 @@ class APIHandler:
         else:
             file_parts = self.cgfs.split_path(f_name)
 
-        with self.cgfs._lock:
-            f = self._get_file(payload['file'])
-            if not isinstance(f, SingleFile):
-                return f
+        f = self._get_file(payload['file'])
+        if not isinstance(f, SingleFile):
+            return f
 
-            return {'ok': isinstance(f, File)}
+        return {'ok': isinstance(f, File)}
 
     def get_feedback(self, payload: t.Dict[str, t.Any]) -> APIHandlerResponse:
         assert cgapi is not None
 
-        with self.cgfs._lock:
-            f = self._get_file(payload['file'])
-            if not isinstance(f, SingleFile):
-                return f
+        f = self._get_file(payload['file'])
+        if not isinstance(f, SingleFile):
+            return f
 
-            if not isinstance(f, File):
-                return {'ok': False, 'error': 'File not a sever file'}
+        if not isinstance(f, File):
+            return {'ok': False, 'error': 'File not a sever file'}
 
-            try:
-                res = cgapi.get_feedback(f.id)
-            except:
-                return {'ok': False, 'error': 'The server returned an error'}
+        try:
+            res = cgapi.get_feedback(f.id)
+        except:
+            return {'ok': False, 'error': 'The server returned an error'}
+
+        return {'ok': True, 'data': res}
+
+    def get_stats(self, payload: t.Dict[str, t.Any]) -> APIHandlerResponse:
+        assert cgapi is not None
+
+        return {
+            'ok':
+                True,
+            'data':
+                dict(
+                    cgapi.stats(),
+                    prefetch=self.cgfs.prefetcher.stats(),
+                    content_cache=self.cgfs.content_cache.stats(),
+                    blob_store=(
+                        None if self.cgfs.blob_store is None else
+                        self.cgfs.blob_store.stats()
+                    ),
+                    write_back=(
+                        None if self.cgfs.write_back is None else
+                        self.cgfs.write_back.stats()
+                    ),
+                ),
+        }
 
-            return {'ok': True, 'data': res}
+    def invalidate(self, payload: t.Dict[str, t.Any]) -> APIHandlerResponse:
+        self.cgfs.invalidate()
+        return {'ok': True}
 
     def set_feedback(self, payload: t.Dict[str, t.Any]) -> APIHandlerResponse:
         line = payload['line']
         message = payload['message']
 
-        with self.cgfs._lock:
-            f = self._get_file(payload['file'])
-            if not isinstance(f, SingleFile):
-                return f
+        f = self._get_file(payload['file'])
+        if not isinstance(f, SingleFile):
+            return f
 
-            if not isinstance(f, File):
-                return {
-                    'ok': False,
-                    'error': 'File not found or not a server file'
-                }
+        if not isinstance(f, File):
+            return {
+                'ok': False,
+                'error': 'File not found or not a server file'
+            }
 
-            assert cgapi is not None
-            try:
-                cgapi.add_feedback(f.id, line, message)
-            except:
-                return {'ok': False, 'error': 'The server returned an error'}
+        assert cgapi is not None
+        try:
+            cgapi.add_feedback(f.id, line, message)
+        except:
+            return {'ok': False, 'error': 'The server returned an error'}
 
-            return {'ok': True}
+        return {'ok': True}
 
 
 FileHandle = t.NewType('FileHandle', int)
@@ -1500,13 +2086,33 @@ class CGFS(LoggingMixIn, Operations):
         assigned_only: bool = False,
         ascii_only: bool = False,
         iso_timestamps: bool = False,
+        metadata_cache: t.Optional[MetadataCache] = None,
+        threaded: bool = False,
+        prefetch_workers: int = 0,
+        prefetch_file_size: int = 0,
+        content_cache_size: int = 64 * 2**20,
+        blob_store: t.Optional[BlobStore] = None,
+        write_back_delay: t.Optional[float] = None,
     ) -> None:
         self.latest_only = latest_only
+        self.metadata_cache = metadata_cache
+        self.blob_store = blob_store
+        self.threaded = threaded
+        self.prefetcher = Prefetcher(prefetch_workers)
+        self.prefetch_file_size = prefetch_file_size
+        self.content_cache = ContentCache(content_cache_size)
+        self.write_back = None  # type: t.Optional[WriteBackQueue]
+        if write_back_delay is not None:
+            self.write_back = WriteBackQueue(write_back_delay)
+        # The rubrics of all assignments by id, shared by all their files.
+        self.rubrics = {}  # type: t.Dict[int, AssignmentRubric]
         self.fixed = fixed
         self.fd = FileHandle(1)
         self.mountpoint = mountpoint
         self._lock = threading.RLock()
+        self._fd_lock = threading.Lock()
         self._open_files = {}  # type: t.Dict[FileHandle, SingleFile]
+        self._open_paths = {}  # type: t.Dict[FileHandle, str]
         self.assigned_only = assigned_only
         self.iso_timestamps = iso_timestamps
         self.ascii_only = ascii_only
@@ -1539,6 +2145,10 @@ class CGFS(LoggingMixIn, Operations):
                 'name': 'root'
             }, type=DirTypes.FSROOT
         )
+        # An index of all paths of the file system, this is maintained by
+        # the directories when files are inserted or removed.
+        self.files.index = PathIndex()
+        self.files.path = ()
 
         with self._lock:
             self.files.getattr()
@@ -1548,6 +2158,8 @@ class CGFS(LoggingMixIn, Operations):
                     '.cg-mode', b'FIXED\n' if self.fixed else b'NOT_FIXED\n'
                 )
             )
+            if self.write_back is not None:
+                self.files.insert(PendingUploadsFile(self.write_back))
             self.load_courses()
         logger.info('Mounted.')
 
@@ -1560,10 +2172,116 @@ class CGFS(LoggingMixIn, Operations):
             return codegra_fs.utils.remove_special_chars(name)
         return name.replace('/', '-')
 
+    def _load(
+        self,
+        key: str,
+        fetch: t.Callable[[], T],
+        apply: t.Callable[[T], None],
+        lock: t.Optional[threading.RLock] = None,
+    ) -> None:
+        """Get data using ``fetch`` and pass it to ``apply``.
+
+        If a metadata cache is used and it contains the data for ``key`` the
+        cached data is applied directly, and the data is revalidated in the
+        background. If the data changed ``apply`` is called again with the new
+        data, so it should update the existing nodes instead of assuming they
+        do not exist yet.
+
+        :param key: The key of the data in the metadata cache.
+        :param fetch: Function to get the data from the server.
+        :param apply: Function to apply the data to the file system.
+        :param lock: The lock to hold when applying revalidated data, defaults
+            to the global lock.
+        """
+        cache = self.metadata_cache
+        cached = None if cache is None else cache.get(key)
+
+        if cached is None:
+            try:
+                data = fetch()
+            except CGAPIException as e:
+                handle_cgapi_exception(e)
+            if cache is not None:
+                cache.set(key, data)
+            apply(data)
+            return
+
+        # ``apply`` is allowed to modify the data it is given, so we compare
+        # with the serialized version of the cached data.
+        cached_json = json.dumps(cached, sort_keys=True)
+        apply(cached)
+
+        def revalidate() -> None:
+            assert cache is not None
+            try:
+                data = fetch()
+            except CGAPIException as e:
+                logger.warning(
+                    'Could not revalidate cached %s: %s', key, e.description
+                )
+                return
+
+            if json.dumps(data, sort_keys=True) != cached_json:
+                logger.debug('Cached %s changed, updating', key)
+                cache.set(key, data)
+                with lock or self._lock:
+                    apply(data)
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
+    @staticmethod
+    def _sync_children(
+        parent: Directory,
+        items: t.Dict[str, t.Dict[str, t.Any]],
+        make: t.Callable[[t.Dict[str, t.Any], str], BaseFile],
+        is_managed: t.Callable[[BaseFile], bool],
+    ) -> t.Dict[str, BaseFile]:
+        """Make the managed children of ``parent`` match ``items``.
+
+        Managed children that are not in ``items`` are removed, and children
+        are created using ``make`` for new items or items of which the id
+        changed. Existing children are kept as is, so everything already
+        loaded inside them is preserved.
+
+        :param parent: The directory to update.
+        :param items: The wanted children, by name.
+        :param make: Function to create a child from an item and its name.
+        :param is_managed: Function that decides if a child may be updated.
+        :returns: The managed children of ``parent`` by name.
+        """
+        for name, child in list(parent.children.items()):
+            if name not in items and is_managed(child):
+                parent.pop(name)
+
+        res = {}  # type: t.Dict[str, BaseFile]
+        for name, item in items.items():
+            child = parent.children.get(name)
+            if child is not None and not is_managed(child):
+                continue
+
+            if child is None or child.id != item['id']:
+                if child is not None:
+                    parent.pop(name)
+                child = make(item, name)
+                parent.insert(child)
+            res[name] = child
+
+        return res
+
     def load_courses(self) -> None:
         assert cgapi is not None
+        api = cgapi
+
+        self._load('courses', api.get_courses, self._apply_courses)
+        self.files.children_loaded = True
 
-        courses = cgapi.get_courses()
+    def _apply_courses(self, courses: t.List[t.Dict[str, t.Any]]) -> None:
+        # The given courses may be shared with the response caches of the
+        # api, so copy them before annotating them with their directory name.
+        courses = [
+            dict(c, assignments=[dict(a) for a in c['assignments']])
+            for c in courses
+        ]
         for course in courses:
             course['dir_name'] = self._get_directory_name(course['name'])
 
@@ -1581,6 +2299,14 @@ class CGFS(LoggingMixIn, Operations):
                 )[:end]
                 dup['dir_name'] += ' - ' + date
 
+        course_dirs = self._sync_children(
+            self.files,
+            {c['dir_name']: c
+             for c in courses},
+            self._make_course_dir,
+            _is_dir_of_type(DirTypes.COURSE),
+        )
+
         for course in courses:
             assignments = course['assignments']
             for assig in assignments:
@@ -1598,49 +2324,128 @@ class CGFS(LoggingMixIn, Operations):
                         ),
                     )
 
-            course_dir = Directory(
-                course,
-                name=course['dir_name'],
-                type=DirTypes.COURSE,
+            course_dir = t.cast(Directory, course_dirs[course['dir_name']])
+            self._sync_children(
+                course_dir,
+                {a['dir_name']: a
+                 for a in assignments},
+                self._make_assignment_dir,
+                _is_dir_of_type(DirTypes.ASSIGNMENT),
             )
-            course_dir.getattr()
-            self.files.insert(course_dir)
-
-            for assig in assignments:
-                assig_dir = Directory(
-                    assig,
-                    name=assig['dir_name'],
-                    type=DirTypes.ASSIGNMENT,
-                )
-                assig_dir.getattr()
-                course_dir.insert(assig_dir)
-                assig_dir.insert(AssignmentSettingsFile(cgapi, assig['id']))
-                assig_dir.insert(
-                    RubricEditorFile(
-                        cgapi, assig['id'], self.rubric_append_only
-                    )
-                )
-                assig_dir.insert(HelpFile(RubricEditorFile))
-                assig_dir.insert(
-                    SpecialFile(
-                        '.cg-assignment-id',
-                        data=str(assig['id']).encode() + b'\n'
-                    )
-                )
             course_dir.children_loaded = True
-        self.files.children_loaded = True
+
+    def _make_course_dir(
+        self, course: t.Dict[str, t.Any], name: str
+    ) -> Directory:
+        course_dir = Directory(course, name=name, type=DirTypes.COURSE)
+        course_dir.getattr()
+        return course_dir
+
+    def _make_assignment_dir(
+        self, assig: t.Dict[str, t.Any], name: str
+    ) -> Directory:
+        assert cgapi is not None
+
+        assig_dir = Directory(assig, name=name, type=DirTypes.ASSIGNMENT)
+        assig_dir.getattr()
+        self._insert_special_file(
+            assig_dir, AssignmentSettingsFile(cgapi, assig['id'])
+        )
+        self._insert_special_file(
+            assig_dir,
+            RubricEditorFile(
+                cgapi,
+                assig['id'],
+                self._get_rubric(assig['id']),
+                self.rubric_append_only,
+            ),
+        )
+        assig_dir.insert(HelpFile(RubricEditorFile))
+        assig_dir.insert(
+            SpecialFile(
+                '.cg-assignment-id', data=str(assig['id']).encode() + b'\n'
+            )
+        )
+        return assig_dir
+
+    def _get_rubric(self, assignment_id: int) -> AssignmentRubric:
+        assert cgapi is not None
+        return self.rubrics.setdefault(
+            assignment_id, AssignmentRubric(cgapi, assignment_id)
+        )
+
+    def _insert_special_file(self, dir: Directory, file: SpecialFile) -> None:
+        if isinstance(file, CachedSpecialFile):
+            file.refresher = functools.partial(
+                self._refresh_in_background, dir, file
+            )
+        dir.insert(file)
+
+    def _refresh_in_background(
+        self, dir: Directory, file: CachedSpecialFile
+    ) -> bool:
+        if not self.prefetcher.enabled:
+            return False
+        self.prefetcher.submit(
+            ('special', id(file)),
+            functools.partial(self._refresh_special_file, dir, file),
+            Prefetcher.PRIORITY_CONTENT,
+        )
+        return True
+
+    def _refresh_special_file(
+        self, dir: Directory, file: CachedSpecialFile
+    ) -> None:
+        with self._get_dir_lock(dir):
+            if file.is_stale():
+                file.refresh()
+
+    def invalidate(self) -> None:
+        """Make sure the data of all special files, and all cached
+        responses, are requested again before they are used.
+        """
+        assert cgapi is not None
+        cgapi.expire_cache()
+        for rubric in list(self.rubrics.values()):
+            rubric.invalidate()
+
+        with self._lock:
+            todo = [self.files]
+            while todo:
+                dir = todo.pop()
+                for child in list(dir.children.values()):
+                    # The special files are never in directories within
+                    # submissions.
+                    if isinstance(child, Directory) and child.type in (
+                        DirTypes.COURSE,
+                        DirTypes.ASSIGNMENT,
+                        DirTypes.SUBMISSION,
+                    ):
+                        todo.append(child)
+                    elif isinstance(
+                        child, (CachedSpecialFile, ImmutableCachedSpecialFile)
+                    ):
+                        child.expire()
 
     def load_submissions(self, assignment: Directory) -> None:
         assert cgapi is not None
+        api = cgapi
 
-        try:
-            submissions = cgapi.get_submissions(
+        self._load(
+            'submissions/{}/{}'.format(assignment.id, self.latest_only),
+            lambda: api.get_submissions(
                 assignment.id, latest_only=self.latest_only
-            )
-        except CGAPIException as e:  # pragma: no cover
-            handle_cgapi_exception(e)
+            ),
+            lambda subs: self._apply_submissions(assignment, subs),
+        )
+        assignment.children_loaded = True
+
+    def _apply_submissions(
+        self, assignment: Directory, submissions: t.List[t.Dict[str, t.Any]]
+    ) -> None:
+        assert cgapi is not None
 
-        submissions.sort(key=lambda s: s['created_at'])
+        submissions = sorted(submissions, key=lambda s: s['created_at'])
 
         def get_assignee_id(sub):
             if isinstance(sub['assignee'], dict):
@@ -1653,6 +2458,7 @@ class CGFS(LoggingMixIn, Operations):
             get_assignee_id(s) == my_id for s in submissions
         )
 
+        wanted = {}  # type: t.Dict[str, t.Dict[str, t.Any]]
         for sub in submissions:
             if self.latest_only and sub['user']['id'] in seen:
                 continue
@@ -1665,67 +2471,280 @@ class CGFS(LoggingMixIn, Operations):
             }:
                 continue
 
-            sub_dir = Directory(
-                sub,
-                name='{name} - {date}'.format(
-                    name=self._get_directory_name(
-                        codegra_fs.utils.name_of_user(sub['user'])
-                    ),
-                    date=codegra_fs.utils.format_datestring(
-                        sub['created_at'], use_colons=self.iso_timestamps
-                    )
+            name = '{name} - {date}'.format(
+                name=self._get_directory_name(
+                    codegra_fs.utils.name_of_user(sub['user'])
                 ),
-                type=DirTypes.SUBMISSION,
-                writable=True
+                date=codegra_fs.utils.format_datestring(
+                    sub['created_at'], use_colons=self.iso_timestamps
+                )
             )
+            wanted[name] = sub
+
+        # The feedback of all new submissions is requested at once when it
+        # is first needed.
+        feedback = AssignmentFeedback(cgapi, assignment.id)
+        children = self._sync_children(
+            assignment,
+            wanted,
+            functools.partial(
+                self._make_submission_dir, assignment, feedback
+            ),
+            _is_dir_of_type(DirTypes.SUBMISSION),
+        )
 
-            sub_dir.getattr()
-            sub_dir.insert(RubricSelectFile(cgapi, sub['id'], sub['user']))
-            sub_dir.insert(GradeFile(cgapi, sub['id']))
-            sub_dir.insert(FeedbackFile(cgapi, sub['id']))
-            sub_dir.insert(LineFeedbackFile(cgapi, sub['id']))
-            sub_dir.insert(LinterFeedbackFile(cgapi, sub['id']))
-            sub_dir.insert(
-                SpecialFile(
-                    '.cg-group-members',
-                    data=b'\n'.join(
-                        u.encode() for u in
-                        codegra_fs.utils.get_members_of_user(sub['user'])
-                    )
+        # Existing submissions get the newer data of this list, so their
+        # grade and feedback do not have to be requested separately.
+        for name, child in children.items():
+            assert isinstance(child, Directory) and child.metadata is not None
+            child.metadata.update(wanted[name])
+
+    def _make_submission_dir(
+        self,
+        assignment: Directory,
+        feedback: AssignmentFeedback,
+        sub: t.Dict[str, t.Any],
+        name: str,
+    ) -> Directory:
+        assert cgapi is not None
+
+        sub_dir = Directory(
+            sub, name=name, type=DirTypes.SUBMISSION, writable=True
+        )
+        metadata = SubmissionMetadata(cgapi, sub)
+        sub_dir.metadata = metadata
+
+        sub_dir.getattr()
+        self._insert_special_file(
+            sub_dir,
+            RubricSelectFile(
+                cgapi,
+                sub['id'],
+                sub['user'],
+                self._get_rubric(assignment.id),
+            ),
+        )
+        self._insert_special_file(sub_dir, GradeFile(cgapi, metadata))
+        self._insert_special_file(sub_dir, FeedbackFile(cgapi, metadata))
+        get_file_lookup = functools.partial(self._get_file_lookup, sub_dir)
+        sub_dir.insert(
+            LineFeedbackFile(
+                cgapi,
+                sub['id'],
+                assignment_feedback=feedback,
+                get_file_lookup=get_file_lookup,
+            )
+        )
+        sub_dir.insert(
+            LinterFeedbackFile(
+                cgapi,
+                sub['id'],
+                assignment_feedback=feedback,
+                get_file_lookup=get_file_lookup,
+            )
+        )
+        sub_dir.insert(
+            SpecialFile(
+                '.cg-group-members',
+                data=b'\n'.join(
+                    u.encode() for u in
+                    codegra_fs.utils.get_members_of_user(sub['user'])
                 )
             )
+        )
 
-            assignment.insert(sub_dir)
+        # Fetch the files of all submissions in the background, most likely
+        # they are needed soon.
+        sub_dir.files_future = self.prefetcher.submit(
+            ('files', sub['id']),
+            lambda: self._prefetch_submission_files(sub['id']),
+        )
 
-        assignment.children_loaded = True
+        return sub_dir
 
-    def insert_tree(self, dir: Directory, tree: t.Dict[str, t.Any]):
-        for item in tree['entries']:
-            if 'entries' in item:
-                new_dir = Directory(item, writable=True)
-                new_dir.getattr()
-                dir.insert(new_dir)
-                self.insert_tree(new_dir, item)
-            else:
-                dir.insert(File(item))
+    def _prefetch_submission_files(self,
+                                   submission_id: int) -> t.Dict[str, t.Any]:
+        assert cgapi is not None
+        api = cgapi
+        files = api.get_submission_files(submission_id)
+
+        # We only know which files are small if the tree includes their size.
+        todo = [files]
+        while todo and self.prefetch_file_size > 0:
+            for entry in todo.pop()['entries']:
+                size = entry.get('size')
+                if 'entries' in entry:
+                    todo.append(entry)
+                elif (
+                    size is not None and size <= self.prefetch_file_size and
+                    not self._has_cached_content(entry['id'])
+                ):
+                    self.prefetcher.submit(
+                        ('content', entry['id']),
+                        functools.partial(
+                            self._prefetch_content, entry['id'], size
+                        ),
+                        Prefetcher.PRIORITY_CONTENT,
+                    )
+
+        return files
+
+    def _prefetch_content(self, file_id: int, size: int) -> None:
+        assert cgapi is not None
+        self._set_cached_content(file_id, cgapi.get_file(file_id, size))
+
+    def insert_tree(
+        self, dir: Directory, tree: t.Dict[str, t.Any]
+    ) -> None:
+        items = {item['name']: item for item in tree['entries']}
+        children = self._sync_children(
+            dir,
+            items,
+            self._make_tree_node,
+            # Never throw away changes that are not yet sent to the server.
+            lambda f: type(f) in (File, Directory) and
+            not getattr(f, 'dirty', False),
+        )
+        for name, child in children.items():
+            if isinstance(child, Directory):
+                self.insert_tree(child, items[name])
         dir.children_loaded = True
 
+    @staticmethod
+    def _make_tree_node(item: t.Dict[str, t.Any], name: str) -> BaseFile:
+        if 'entries' in item:
+            new_dir = Directory(item, writable=True)
+            new_dir.getattr()
+            return new_dir
+        return File(item)
+
     def load_submission_files(self, submission: Directory) -> None:
         assert cgapi is not None
+        api = cgapi
+        future = submission.files_future
+        submission.files_future = None
+
+        def fetch() -> t.Dict[str, t.Any]:
+            if future is None:
+                return api.get_submission_files(submission.id)
+            # Don't wait for a prefetch worker if the files were not fetched
+            # yet, the user needs them now.
+            self.prefetcher.run_now(('files', submission.id))
+            return future.result()
+
+        self._load(
+            'files/{}'.format(submission.id),
+            fetch,
+            lambda files: self._apply_submission_files(submission, files),
+            lock=self._get_dir_lock(submission),
+        )
 
-        try:
-            files = cgapi.get_submission_files(submission.id)
-        except CGAPIException as e:
-            handle_cgapi_exception(e)
+    def _apply_submission_files(
+        self, submission: Directory, files: t.Dict[str, t.Any]
+    ) -> None:
         self.insert_tree(submission, files)
-        submission.insert(
-            SpecialFile(
-                '.cg-submission-id', data=str(submission.id).encode() + b'\n'
+        if '.cg-submission-id' not in submission.children:
+            submission.insert(
+                SpecialFile(
+                    '.cg-submission-id',
+                    data=str(submission.id).encode() + b'\n'
+                )
             )
-        )
         submission.tld = files['name']
         submission.children_loaded = True
 
+    def _get_file_lookup(self, submission: Directory) -> t.Dict[str, str]:
+        """Get the paths of all files and directories of a submission by
+        their id, like they are reported by the server.
+
+        This uses the loaded tree of the submission, which is only loaded if
+        that was not done yet.
+
+        :param submission: The directory of the submission.
+        :returns: A mapping from the id of each file and directory (as string)
+            to its path, starting with the top level directory.
+        """
+        if not submission.children_loaded:
+            self.load_submission_files(submission)
+
+        res = {}  # type: t.Dict[str, str]
+        todo = [(submission, '/{}'.format(submission.tld))]
+        while todo:
+            dir, path = todo.pop()
+            for name, child in dir.children.items():
+                if not isinstance(child, (File, Directory)):
+                    continue
+                child_path = '{}/{}'.format(path, name)
+                if child.id is not None:
+                    res[str(child.id)] = child_path
+                if isinstance(child, Directory):
+                    todo.append((child, child_path))
+        return res
+
+    def _get_dir_lock(self, dir: Directory) -> threading.RLock:
+        if self.threaded and dir.type == DirTypes.SUBMISSION:
+            return dir.lock
+        return self._lock
+
+    def _get_lock(self, path: str) -> threading.RLock:
+        parts = self.split_path(path)
+        if not self.threaded or len(parts) < 3:
+            return self._lock
+
+        # Finding the submission can load the assignment, which should only be
+        # done with the global lock.
+        with self._lock:
+            try:
+                dir = self.get_file(parts[:3])
+            except FuseOSError:
+                return self._lock
+
+        if isinstance(dir, Directory):
+            return self._get_dir_lock(dir)
+        return self._lock
+
+    @contextlib.contextmanager
+    def _locked(self, *paths: str) -> t.Iterator[None]:
+        """Lock the file system for an operation on the given paths.
+
+        When running multi threaded operations within a submission only lock
+        that submission, so operations on different submissions (which
+        probably wait on the server) can run at the same time. Other
+        operations, and all operations when running single threaded, use the
+        global lock. As the global lock is always acquired first, and never
+        while holding a submission lock, this cannot deadlock.
+
+        :param paths: The paths the operation works on.
+        """
+        locks = []  # type: t.List[threading.RLock]
+        for lock in map(self._get_lock, paths):
+            if all(lock is not l for l in locks):
+                locks.append(lock)
+        locks.sort(key=lambda l: (l is not self._lock, id(l)))
+
+        with contextlib.ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
+
+    def _add_open_file(self, file: SingleFile, path: str) -> FileHandle:
+        with self._fd_lock:
+            self.fd = FileHandle(self.fd + 1)
+            self._open_files[self.fd] = file
+            self._open_paths[self.fd] = path
+            return self.fd
+
+    def get_path_of_fh(self, fh: FileHandle) -> str:
+        """Get the path with which the given file handle was opened.
+        """
+        return self._open_paths[fh]
+
+    def load_children(self, dir: Directory) -> None:
+        if dir.type == DirTypes.ASSIGNMENT:
+            self.load_submissions(dir)
+        elif dir.type == DirTypes.SUBMISSION:
+            self.load_submission_files(dir)
+
     def split_path(self, path: str) -> t.List[str]:
         return [x for x in path.split('/') if x]
 
@@ -1750,33 +2769,37 @@ class CGFS(LoggingMixIn, Operations):
         expect_type: t.Type[T] = None
     ) -> T:
         file = start if start is not None else self.files
-        parts = self.split_path(path) if isinstance(path, str) else path
+        if isinstance(path, str):
+            path = self.split_path(path)
+        parts = [p for p in path if p]
+
+        index = file.index
+        key = None  # type: t.Optional[PathKey]
+        if index is not None and file.path is not None:
+            key = file.path + tuple(parts)
+            found = index.get(key)
+            if found is not None:
+                return self._check_type(found, expect_type)
+            if index.is_missing(key):
+                raise FuseOSError(ENOENT)
 
         for part in parts:
-            if part == '':  # pragma: no cover
-                continue
-
-            try:
-                if not any(
-                    not isinstance(f, SpecialFile)
-                    for f in file.children.values()
-                ):
-                    if file.type == DirTypes.ASSIGNMENT:
-                        self.load_submissions(file)
-                    elif file.type == DirTypes.SUBMISSION:
-                        self.load_submission_files(file)
-            except AttributeError:  # pragma: no cover
-                if not isinstance(file, Directory):
-                    logger.error('File is not a directory.')
-                    raise FuseOSError(ENOTDIR)
-                logger.error('An unexpected error occurred.')
-                logger.debug(traceback.format_exc())
-                raise
+            if not isinstance(file, Directory):
+                logger.error('File is not a directory.')
+                raise FuseOSError(ENOTDIR)
+            if not file.children_loaded:
+                self.load_children(file)
 
             if part not in file.children or file.children[part] is None:
+                if index is not None and key is not None:
+                    index.add_missing(key)
                 raise FuseOSError(ENOENT)
             file = file.children[part]  # type: ignore
 
+        return self._check_type(file, expect_type)
+
+    @staticmethod
+    def _check_type(file: BaseFile, expect_type: t.Optional[t.Type[T]]) -> T:
         if expect_type is not None:
             if not isinstance(file, expect_type):
                 logger.error(
@@ -1810,7 +2833,7 @@ class CGFS(LoggingMixIn, Operations):
         raise FuseOSError(ENOTSUP)
 
     def create(self, path: str, mode: int) -> FileHandle:
-        with self._lock:
+        with self._locked(path):
             return self._create(path, mode)
 
     def _create(self, path: str, mode: int) -> FileHandle:
@@ -1830,28 +2853,42 @@ class CGFS(LoggingMixIn, Operations):
         if self.fixed or not sync:
             file = TempFile(fname, self._tmpdir)  # type: SingleFile
         else:
-            submission = self.get_submission(path)
-            assert isinstance(submission.tld, str)
-
-            query_path = submission.tld + '/' + '/'.join(parts[3:])
-            assert cgapi is not None
-            try:
-                fdata = cgapi.create_file(submission.id, query_path)
-            except CGAPIException as e:
-                handle_cgapi_exception(e)
-
-            file = File(fdata, name=fname)
-            file.setattr('st_size', fdata['size'])
-            file.setattr('st_mtime', fdata['modification_date'])
+            # The file is only created on the server when it is flushed, so
+            # it can be created with its contents in a single request.
+            file = File({'id': None, 'name': fname})
+            file.getattr()
 
         parent.insert(file)
 
         file.open(bytes('', 'utf8'))
+        if isinstance(file, File):
+            file.dirty = True
+
+        return self._add_open_file(file, path)
 
-        self.fd = FileHandle(self.fd + 1)
-        self._open_files[self.fd] = file
+    def _create_on_server(self, file: File, path: str) -> None:
+        """Create a file that was created locally on the server, with its
+        current contents.
 
-        return self.fd
+        :param file: The file to create.
+        :param path: The current path of the file.
+        """
+        submission = self.get_submission(path)
+        assert isinstance(submission.tld, str)
+
+        parts = self.split_path(path)
+        query_path = submission.tld + '/' + '/'.join(parts[3:])
+        assert cgapi is not None
+        try:
+            fdata = cgapi.create_file(
+                submission.id, query_path, bytes(file.data)
+            )
+        except CGAPIException as e:
+            handle_cgapi_exception(e)
+
+        file.dirty = False
+        file.setattr('st_mtime', fdata['modification_date'])
+        self._set_file_id(file, fdata['id'])
 
     def fsync(self, path: str, _: object, fh: OptFileHandle) -> None:
         self._do_fsync_like(path, fh, FsyncLike.fsync)
@@ -1862,10 +2899,29 @@ class CGFS(LoggingMixIn, Operations):
     def _do_fsync_like(
         self, path: str, fh: OptFileHandle, todo: FsyncLike
     ) -> None:
-        with self._lock:
+        if self.write_back is not None and todo == FsyncLike.fsync:
+            with self._locked(path):
+                file = self.get_file_with_fh(path, fh)
+            # An fsync should wait until the file is really uploaded. This
+            # cannot be done while locked, as the upload needs the lock.
+            self.write_back.flush(file)
+
+        lock = self._get_lock(path)
+        with lock:
             set_fuse_context('%s: Could not save file', path)
             file = self.get_file_with_fh(path, fh)
 
+            if isinstance(file, File) and file.id is None:
+                self._create_on_server(file, path)
+                return
+
+            if (
+                self.write_back is not None and todo == FsyncLike.flush and
+                isinstance(file, File)
+            ):
+                self._schedule_upload(file, lock)
+                return
+
             if todo == FsyncLike.fsync:
                 res = file.fsync()
             elif todo == FsyncLike.flush:
@@ -1874,10 +2930,60 @@ class CGFS(LoggingMixIn, Operations):
                 assert False
 
             if res is not None:
+                self._set_file_id(file, res['id'])
+
+    def _set_file_id(self, file: File, file_id: int) -> None:
+        # The old contents are never requested again.
+        if file.id is not None:
+            self._remove_cached_content(file.id)
+        file.id = file_id
+        self._cache_content(file)
+
+    def _schedule_upload(self, file: File, lock: threading.RLock) -> None:
+        assert self.write_back is not None
+        if not file.dirty:
+            return
+
+        file.pending_data = bytes(file.data)
+        file.dirty = False
+        self.write_back.schedule(file, lambda: self._upload(file, lock))
+
+    def _upload(self, file: File, lock: threading.RLock) -> None:
+        assert cgapi is not None
+        with lock:
+            data = file.pending_data
+            file_id = file.id
+        if data is None:
+            return
+
+        try:
+            res = cgapi.patch_file(file_id, data)
+        except CGAPIException as e:
+            with lock:
+                if file.pending_data is data:
+                    # Try again the next time the file is flushed.
+                    file.pending_data = None
+                    file.dirty = True
+            logger.error(
+                'Uploading {} failed: {}'.format(file.name, e.message),
+                extra={'notify': 'critical'},
+            )
+            return
+
+        with lock:
+            if file.pending_data is not data:
+                # The file was flushed again, this upload will follow.
+                self._remove_cached_content(file.id)
                 file.id = res['id']
+                return
+
+            file.pending_data = None
+            self._set_file_id(file, res['id'])
+            if not file.dirty and file not in self._open_files.values():
+                file.release()
 
     def getattr(self, path: str, fh: OptFileHandle = None) -> FullStat:
-        with self._lock:
+        with self._locked(path):
             return self._getattr(path, fh)
 
     def _getattr(self, path: str, fh: OptFileHandle) -> FullStat:
@@ -1888,9 +2994,25 @@ class CGFS(LoggingMixIn, Operations):
         else:
             file = self._open_files[fh]
 
+        if (
+            isinstance(file, CachedSpecialFile) and file.is_stale() and
+            file.refresher is not None
+        ):
+            # Getting the attributes never requests the data of a special
+            # file, but do refresh it so its size is correct next time.
+            file.refresher()
+
         if isinstance(file, (TempFile, SpecialFile)):
             return file.getattr()
 
+        if (
+            isinstance(file, Directory) and
+            file.type == DirTypes.SUBMISSION and not file.children_loaded
+        ):
+            # The user is probably entering this submission, so its files
+            # should be fetched before those of all other submissions.
+            self.prefetcher.prioritize(('files', file.id))
+
         submission = None  # type: t.Optional[Directory]
         query_path = None  # type: t.Optional[str]
 
@@ -1923,7 +3045,7 @@ class CGFS(LoggingMixIn, Operations):
         raise FuseOSError(ENOTSUP)
 
     def mkdir(self, path: str, mode: int) -> None:
-        with self._lock:
+        with self._locked(path):
             return self._mkdir(path, mode)
 
     def _mkdir(self, path: str, mode: int) -> None:
@@ -1961,7 +3083,7 @@ class CGFS(LoggingMixIn, Operations):
             parent.insert(Directory(ddata, name=dname, writable=True))
 
     def open(self, path: str, flags: int) -> FileHandle:
-        with self._lock:
+        with self._locked(path):
             return self._open(path, flags)
 
     def _open(self, path: str, flags: int) -> FileHandle:
@@ -1973,6 +3095,8 @@ class CGFS(LoggingMixIn, Operations):
 
         if isinstance(file, (TempFile, SpecialFile)):
             file.open(b'')
+        elif isinstance(file, File):
+            self._load_cached_content(file)
 
         # This is handled by fuse [0] but it can be disabled so it is better to
         # be safe than sorry as it can be enabled.
@@ -1980,46 +3104,117 @@ class CGFS(LoggingMixIn, Operations):
         if flags & O_TRUNC:  # pragma: no cover
             file.truncate(0)
 
-        self.fd = FileHandle(self.fd + 1)
-        self._open_files[self.fd] = file
-        return self.fd
+        return self._add_open_file(file, path)
 
-    def read(self, path: str, size: int, offset: int, fh: FileHandle) -> bytes:
-        with self._lock:
+    def _load_cached_content(self, file: File) -> None:
+        if file.dirty or file.is_loaded():
+            return
+        data = self._get_cached_content(file.id)
+        if data is not None:
+            file.getattr()
+            # This is valid as we use a setter
+            file.data = data  # type: ignore
+
+    def _cache_content(self, file: File) -> None:
+        if file.id is None or file.id in self.content_cache:
+            return
+        max_size = self.content_cache.max_entry_size
+        if self.blob_store is not None:
+            max_size = max(max_size, self.blob_store.max_entry_size)
+        data = file.get_clean_data(max_size)
+        if data is not None:
+            self._set_cached_content(file.id, data)
+
+    def _has_cached_content(self, file_id: int) -> bool:
+        return file_id in self.content_cache or (
+            self.blob_store is not None and file_id in self.blob_store
+        )
+
+    def _get_cached_content(self, file_id: int) -> t.Optional[bytes]:
+        data = self.content_cache.get(file_id)
+        if data is None and self.blob_store is not None:
+            data = self.blob_store.get(file_id)
+            if data is not None:
+                self.content_cache.set(file_id, data)
+        return data
+
+    def _set_cached_content(self, file_id: int, data: bytes) -> None:
+        self.content_cache.set(file_id, data)
+        if self.blob_store is not None:
+            self.blob_store.set(file_id, data)
+
+    def _remove_cached_content(self, file_id: int) -> None:
+        self.content_cache.remove(file_id)
+        if self.blob_store is not None:
+            self.blob_store.remove(file_id)
+
+    def read(self, path: str, size: int, offset: int,
+             fh: FileHandle) -> ReadBuffer:
+        with self._locked(path):
             set_fuse_context('%s: Reading file failed', path)
             file = self._open_files[fh]
             return file.read(offset, size)
 
-    def readdir(self, path: str, fh: OptFileHandle) -> t.List[str]:
-        with self._lock:
+    def readdir(self, path: str, fh: OptFileHandle) -> t.List[DirEntry]:
+        with self._locked(path):
             set_fuse_context('%s: Reading directory failed', path)
             dir = self.get_dir(path)
 
             if not dir.children_loaded:
-                if dir.type == DirTypes.ASSIGNMENT:
-                    self.load_submissions(dir)
-                elif dir.type == DirTypes.SUBMISSION:
-                    self.load_submission_files(dir)
-
-            return dir.read()
+                self.load_children(dir)
+
+            # Return the attributes of all children we already know. The
+            # fusepy engine only passes their mode on to the kernel, but the
+            # pyfuse3 engine uses them to answer readdirplus.
+            res = []  # type: t.List[DirEntry]
+            for name in dir.read():
+                child = dir.children.get(name)
+                attrs = None if child is None else self._get_known_attrs(child)
+                res.append(name if attrs is None else (name, attrs, 0))
+            return res
+
+    def _get_known_attrs(self, file: BaseFile) -> t.Optional[FullStat]:
+        """Get the attributes of the given file if this can be done without
+        doing any requests.
+        """
+        if isinstance(file, (Directory, TempFile, SpecialFile)):
+            return file.getattr()
+        elif isinstance(file, File) and (
+            file.stat is not None or file.meta is not None
+        ):
+            attrs = file.getattr()
+            if self.fixed:
+                attrs['st_mode'] = remove_permission(
+                    attrs['st_mode'], write=True
+                )
+            return attrs
+        return None
 
     def readlink(self, path: str) -> None:
         logger.error('Links are not supported.')
         raise FuseOSError(ENOTSUP)
 
     def release(self, path: str, fh: FileHandle) -> None:
-        with self._lock:
+        with self._locked(path):
             set_fuse_context('%s: Closing file failed', path)
             file = self._open_files[fh]
-            file.release()
             del self._open_files[fh]
+            del self._open_paths[fh]
+
+            if isinstance(file, File):
+                if file.id is None:
+                    self._create_on_server(file, path)
+                # Keep the contents, so opening the file again does not
+                # download it again.
+                self._cache_content(file)
+            file.release()
 
     # TODO?: Add xattr support
     def removexattr(self, path: str, name: str) -> None:
         raise FuseOSError(ENOTSUP)
 
     def rename(self, old: str, new: str) -> None:
-        with self._lock:
+        with self._locked(old, new):
             return self._rename(old, new)
 
     def _rename(self, old: str, new: str) -> None:
@@ -2067,6 +3262,12 @@ class CGFS(LoggingMixIn, Operations):
                 )
                 raise FuseOSError(EPERM)
 
+        # A file that is not yet created on the server is created at its new
+        # location when it is flushed.
+        if (
+            not isinstance(file, (TempDirectory, TempFile)) and
+            file.id is not None
+        ):
             assert cgapi is not None
 
             assert isinstance(old_submission.tld, str)
@@ -2085,7 +3286,7 @@ class CGFS(LoggingMixIn, Operations):
         new_parent.insert(file)
 
     def rmdir(self, path: str) -> None:
-        with self._lock:
+        with self._locked(path):
             return self._rmdir(path)
 
     def _rmdir(self, path: str) -> None:
@@ -2145,7 +3346,7 @@ class CGFS(LoggingMixIn, Operations):
     def truncate(
         self, path: str, length: int, fh: OptFileHandle = None
     ) -> None:
-        with self._lock:
+        with self._locked(path):
             set_fuse_context('%s: Truncating file failed', path)
             if length < 0:  # pragma: no cover
                 raise FuseOSError(EINVAL)
@@ -2159,10 +3360,12 @@ class CGFS(LoggingMixIn, Operations):
                 )
                 raise FuseOSError(EPERM)
 
+            if isinstance(file, File):
+                self._load_cached_content(file)
             file.truncate(length)
 
     def unlink(self, path: str) -> None:
-        with self._lock:
+        with self._locked(path):
             set_fuse_context('%s: Removing file failed', path)
             parts = self.split_path(path)
             parent = self.get_dir(parts[:-1])
@@ -2182,16 +3385,23 @@ class CGFS(LoggingMixIn, Operations):
                     )
                     raise FuseOSError(EPERM)
 
-                assert cgapi is not None
-                try:
-                    cgapi.delete_file(file.id)
-                except CGAPIException as e:
-                    handle_cgapi_exception(e)
+                if self.write_back is not None:
+                    self.write_back.cancel(file)
+                    file.pending_data = None
+
+                # The file might not be created on the server yet.
+                if file.id is not None:
+                    assert cgapi is not None
+                    try:
+                        cgapi.delete_file(file.id)
+                    except CGAPIException as e:
+                        handle_cgapi_exception(e)
+                    self._remove_cached_content(file.id)
 
             parent.pop(fname)
 
     def utimens(self, path: str, times: t.Tuple[float, float] = None) -> None:
-        with self._lock:
+        with self._locked(path):
             set_fuse_context(
                 '%s: Changing file modification times failed', path
             )
@@ -2211,7 +3421,7 @@ class CGFS(LoggingMixIn, Operations):
     def write(
         self, path: str, data: bytes, offset: int, fh: FileHandle
     ) -> int:
-        with self._lock:
+        with self._locked(path):
             set_fuse_context('%s: Writing file failed', path)
             file = self._open_files[fh]
 
@@ -2233,8 +3443,19 @@ def create_and_mount_fs(
     rubric_append_only: bool,
     ascii_only: bool,
     iso_timestamps: bool,
+    metadata_cache_dir: t.Optional[str] = None,
+    negative_timeout: float = 1.0,
+    threaded: bool = False,
+    engine: str = 'fusepy',
+    prefetch_workers: int = 0,
+    prefetch_file_size: int = 0,
+    content_cache_size: int = 64 * 2**20,
+    blob_store_dir: t.Optional[str] = None,
+    blob_store_size: int = 0,
+    write_back_delay: t.Optional[float] = None,
 ) -> None:
     global cgapi
+    assert cgapi is not None
 
     logger.info('Mounting... ')
 
@@ -2263,6 +3484,24 @@ def create_and_mount_fs(
                 'to_code': 'UTF-8-MAC',
                 'modules': 'iconv',
             }
+        elif sys.platform.startswith('linux'):
+            # Let the kernel remember that paths do not exist, so that the
+            # many probes of editors and other tools don't reach us.
+            kwargs = {
+                'negative_timeout': str(negative_timeout),
+            }
+
+        metadata_cache = None
+        if metadata_cache_dir is not None:
+            metadata_cache = MetadataCache(
+                metadata_cache_dir, cgapi.routes.base, cgapi.user['id']
+            )
+
+        blob_store = None
+        if blob_store_dir is not None and blob_store_size > 0:
+            blob_store = BlobStore(
+                blob_store_dir, cgapi.routes.base, blob_store_size
+            )
 
         fs = None
         try:
@@ -2276,15 +3515,28 @@ def create_and_mount_fs(
                 assigned_only=assigned_only,
                 ascii_only=ascii_only,
                 iso_timestamps=iso_timestamps,
+                metadata_cache=metadata_cache,
+                # The pyfuse3 engine always runs operations concurrently.
+                threaded=threaded or engine == 'pyfuse3',
+                prefetch_workers=prefetch_workers,
+                prefetch_file_size=prefetch_file_size,
+                content_cache_size=content_cache_size,
+                blob_store=blob_store,
+                write_back_delay=write_back_delay,
             )
-            FUSE(
-                fs,
-                mountpoint,
-                nothreads=True,
-                foreground=True,
-                direct_io=True,
-                **kwargs,
-            )
+            if engine == 'pyfuse3':
+                pyfuse3_engine.mount(
+                    fs, mountpoint, negative_timeout=negative_timeout
+                )
+            else:
+                FUSE(
+                    fs,
+                    mountpoint,
+                    nothreads=not threaded,
+                    foreground=True,
+                    direct_io=True,
+                    **kwargs,
+                )
         except RuntimeError as e:  # pragma: no cover
             set_fuse_context('Unexpected error')
             logger.critical(str(e), extra={'notify': 'critical'})
@@ -2293,8 +3545,20 @@ def create_and_mount_fs(
             set_fuse_context('Error occurred during exit')
             if fs is not None and hasattr(fs, 'api_handler'):
                 fs.api_handler.stop = True
+            if fs is not None:
+                fs.prefetcher.stop()
+            if fs is not None and fs.write_back is not None:
+                pending = fs.write_back.pending()
+                if pending:
+                    logger.info('Uploading %d changed files...', pending)
+                fs.write_back.flush_all()
+                fs.write_back.stop()
             if os.path.isfile(sockfile):
                 os.unlink(sockfile)
+            if metadata_cache is not None:
+                metadata_cache.close()
+            if blob_store is not None:
+                blob_store.close()
 
 
 def check_version() -> None:
@@ -2323,6 +3587,7 @@ def login(args: argparse.Namespace) -> t.Optional[CGAPI]:
                 jwt_token,
                 args.url,
                 fixed=args.fixed,
+                parallel_requests=args.parallel_requests,
             )
         else:
             password = get_password(t.cast(str, args.password))
@@ -2333,6 +3598,7 @@ def login(args: argparse.Namespace) -> t.Optional[CGAPI]:
                 password=password,
                 base=args.url,
                 fixed=args.fixed,
+                parallel_requests=args.parallel_requests,
             )
     except CGAPIException as e:
         logger.critical('Login failed: {}'.format(e.description))
@@ -2497,6 +3763,91 @@ def main() -> None:
         action='store_true',
         help='Display dates as UTC ISO8601 timestamps',
     )
+    argparser.add_argument(
+        '--parallel-requests',
+        metavar='AMOUNT',
+        dest='parallel_requests',
+        type=int,
+        default=1,
+        help=constants.parallel_requests_help,
+    )
+    argparser.add_argument(
+        '--metadata-cache',
+        dest='metadata_cache',
+        action='store_true',
+        default=False,
+        help=constants.metadata_cache_help,
+    )
+    argparser.add_argument(
+        '--cache-dir',
+        metavar='DIRECTORY',
+        dest='cache_dir',
+        type=str,
+        default=get_default_cache_dir(),
+        help=constants.cache_dir_help,
+    )
+    argparser.add_argument(
+        '--negative-timeout',
+        metavar='SECONDS',
+        dest='negative_timeout',
+        type=float,
+        default=1.0,
+        help=constants.negative_timeout_help,
+    )
+    argparser.add_argument(
+        '--threads',
+        dest='threaded',
+        action='store_true',
+        default=False,
+        help=constants.threads_help,
+    )
+    argparser.add_argument(
+        '--engine',
+        dest='engine',
+        choices=['fusepy', 'pyfuse3'],
+        default='fusepy',
+        help=constants.engine_help,
+    )
+    argparser.add_argument(
+        '--prefetch-workers',
+        metavar='AMOUNT',
+        dest='prefetch_workers',
+        type=int,
+        default=None,
+        help=constants.prefetch_workers_help,
+    )
+    argparser.add_argument(
+        '--prefetch-file-size',
+        metavar='BYTES',
+        dest='prefetch_file_size',
+        type=int,
+        default=0,
+        help=constants.prefetch_file_size_help,
+    )
+    argparser.add_argument(
+        '--memory-cache-size',
+        metavar='MIB',
+        dest='memory_cache_size',
+        type=int,
+        default=64,
+        help=constants.memory_cache_size_help,
+    )
+    argparser.add_argument(
+        '--cache-size',
+        metavar='MIB',
+        dest='cache_size',
+        type=int,
+        default=0,
+        help=constants.cache_size_help,
+    )
+    argparser.add_argument(
+        '--write-back',
+        metavar='SECONDS',
+        dest='write_back_delay',
+        type=float,
+        default=None,
+        help=constants.write_back_help,
+    )
     args = argparser.parse_args()
 
     if args.gui_mode:
@@ -2518,6 +3869,12 @@ def main() -> None:
     )
     check_version()
 
+    if args.engine == 'pyfuse3' and not pyfuse3_engine.is_available():
+        logger.error(
+            'The pyfuse3 engine requires the pyfuse3 and trio packages.'
+        )
+        return
+
     cgapi = login(args)
 
     if cgapi is None:
@@ -2548,6 +3905,21 @@ def main() -> None:
             rubric_append_only=args.rubric_append_only,
             ascii_only=args.ascii_only,
             iso_timestamps=args.iso_timestamps,
+            metadata_cache_dir=(
+                args.cache_dir if args.metadata_cache else None
+            ),
+            negative_timeout=args.negative_timeout,
+            threaded=args.threaded,
+            engine=args.engine,
+            prefetch_workers=(
+                args.parallel_requests // 2
+                if args.prefetch_workers is None else args.prefetch_workers
+            ),
+            prefetch_file_size=args.prefetch_file_size,
+            content_cache_size=args.memory_cache_size * 2**20,
+            blob_store_dir=args.cache_dir,
+            blob_store_size=args.cache_size * 2**20,
+            write_back_delay=args.write_back_delay,
         )
     finally:
         if sys.platform != 'win32':
@@ -62,3 +62,54 @@ examples:
 
 ascii_only_help = """Replace all non ASCII characters in directories generated
 by CGFS with question marks."""
+
+parallel_requests_help = """The maximum amount of requests to the server that
+may be in flight at the same time. Defaults to 1, which does all requests one
+after the other."""
+
+metadata_cache_help = """Keep a cache of the courses, assignments, submissions
+and files on disk. This makes the file system available almost instantly when
+it is mounted again, after which all data is checked for changes in the
+background."""
+
+cache_dir_help = """The directory in which caches are stored. Defaults to the
+cache directory of your user."""
+
+negative_timeout_help = """The amount of seconds the kernel may remember that a
+path does not exist. This is only supported on Linux, defaults to 1 second."""
+
+threads_help = """Handle file system operations in multiple threads, so that
+operations on different submissions can be done at the same time. This is
+most useful together with `--parallel-requests`."""
+
+engine_help = """The FUSE binding used to serve the file system. The default
+'fusepy' engine uses libfuse 2, the 'pyfuse3' engine uses libfuse 3 and
+handles all requests of the kernel concurrently. It requires the optional
+pyfuse3 and trio packages."""
+
+prefetch_workers_help = """The maximum amount of submissions for which files
+are fetched in the background at the same time. The files of all submissions
+in an assignment are prefetched as soon as the assignment is listed, those of
+the submission you enter first. Use 0 to disable prefetching. Defaults to half
+of `--parallel-requests`."""
+
+prefetch_file_size_help = """Also prefetch the contents of files that are at
+most this amount of bytes large, after the files of the submissions are
+fetched. This only works if the server includes the sizes of files in the file
+tree. Defaults to 0, which disables it."""
+
+memory_cache_size_help = """The amount of memory in MiB used to keep the
+contents of files that were read, so they are not downloaded again when they
+are opened again. Defaults to 64 MiB."""
+
+cache_size_help = """The amount of disk space in MiB used to keep the contents
+of files that were read in the cache directory, so they are not downloaded
+again when the file system is mounted again. Defaults to 0, which disables
+this cache."""
+
+write_back_help = """Upload changed files in the background, this many seconds
+after they were last saved, instead of waiting for the upload on every save.
+Saving a file several times within this period uploads it only once. Calling
+fsync on a file still waits for the upload. The amount of uploads that are not
+yet finished is shown in the `.cg-pending-uploads` file in the root of the
+mount. By default files are uploaded immediately."""
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import heapq
+import typing as t
+import logging
+import itertools
+import threading
+import collections
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar('T')
+
+
+class _Job(t.Generic[T]):
+    def __init__(self, fun: t.Callable[[], T], priority: int) -> None:
+        self.fun = fun
+        self.priority = priority
+        self.started = False
+        self.future = Future()  # type: Future[T]
+
+
+class Prefetcher:
+    """Fetch data in the background before it is requested.
+
+    Jobs are identified by a key and are run by at most ``max_workers`` worker
+    threads, jobs with a lower priority are started first. The priority of a
+    job that is still queued can be raised with :meth:`prioritize`, and a
+    thread that needs the result of a queued job can run it itself with
+    :meth:`run_now` instead of waiting for a worker to pick it up.
+
+    :param max_workers: The maximum amount of jobs that run at the same time,
+        if this is 0 nothing is prefetched.
+    """
+    #: The priority of data in a directory the user entered.
+    PRIORITY_ENTERED = 0
+    #: The priority of the file trees of submissions.
+    PRIORITY_TREE = 10
+    #: The priority of the contents of files.
+    PRIORITY_CONTENT = 20
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max(max_workers, 0)
+        self._cond = threading.Condition()
+        self._queue = []  # type: t.List[t.Tuple[int, int, t.Hashable]]
+        self._jobs = {}  # type: t.Dict[t.Hashable, _Job]
+        self._counter = itertools.count()
+        self._workers = []  # type: t.List[threading.Thread]
+        self._stopped = False
+        self._stats = collections.Counter()  # type: t.Counter[str]
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _push(self, key: t.Hashable, priority: int) -> None:
+        # A job is pushed again when its priority changes, the old entry is
+        # skipped by the workers as its priority no longer matches.
+        heapq.heappush(self._queue, (priority, next(self._counter), key))
+        if len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        self._cond.notify()
+
+    def submit(
+        self,
+        key: t.Hashable,
+        fun: t.Callable[[], T],
+        priority: int = PRIORITY_TREE,
+    ) -> t.Optional['Future[T]']:
+        """Queue a job, unless a job with the same key is already queued.
+
+        :param key: The key identifying the job.
+        :param fun: The function that does the job.
+        :param priority: The priority of the job, lower is earlier.
+        :returns: A future of the result of the job, or ``None`` if
+            prefetching is disabled or a job for this key already exists.
+        """
+        if not self.enabled:
+            return None
+
+        with self._cond:
+            if self._stopped or key in self._jobs:
+                return None
+            job = _Job(fun, priority)
+            self._jobs[key] = job
+            self._stats['queued'] += 1
+            self._push(key, priority)
+            return job.future
+
+    def prioritize(
+        self, key: t.Hashable, priority: int = PRIORITY_ENTERED
+    ) -> None:
+        """Raise the priority of a queued job.
+
+        :param key: The key of the job, nothing is done if there is no queued
+            job with this key.
+        :param priority: The new priority of the job.
+        """
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None or job.started or job.priority <= priority:
+                return
+            job.priority = priority
+            self._stats['prioritized'] += 1
+            self._push(key, priority)
+
+    def run_now(self, key: t.Hashable) -> None:
+        """Run the job with the given key on this thread if it has not been
+        started yet.
+
+        The result of the job is set on the future returned by
+        :meth:`submit` as usual.
+
+        :param key: The key of the job.
+        """
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None or job.started:
+                return
+            job.started = True
+            self._stats['run_now'] += 1
+        self._run(key, job)
+
+    def _run(self, key: t.Hashable, job: _Job) -> None:
+        try:
+            res = job.fun()
+        except BaseException as e:
+            logger.debug('Prefetching %s failed: %s', key, e)
+            job.future.set_exception(e)
+            failed = True
+        else:
+            job.future.set_result(res)
+            failed = False
+
+        with self._cond:
+            self._stats['failed' if failed else 'done'] += 1
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                priority, _, key = heapq.heappop(self._queue)
+                job = self._jobs.get(key)
+                if job is None or job.started or job.priority != priority:
+                    continue
+                job.started = True
+            self._run(key, job)
+
+    def stop(self) -> None:
+        """Stop the workers.
+
+        Jobs that are still queued are only run when :meth:`run_now` is
+        called for them.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._cond:
+            res = dict(self._stats)  # type: t.Dict[str, float]
+            res['pending'] = len(self._jobs)
+            return res
+
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-only
+"""An alternative engine for CGFS built on pyfuse3 and trio.
+
+The fusepy engine handles one kernel request at a time (or one per thread).
+This engine runs every request as a trio task, and the synchronous operations
+of CGFS in a bounded pool of worker threads, so hundreds of outstanding kernel
+requests can be serviced at the same time by a single process. It uses the
+operations and nodes of the normal file system, which should be created with
+``threaded=True`` so that operations on different submissions don't wait on
+each other.
+
+pyfuse3 is an optional dependency, which only works with libfuse 3.
+"""
+
+import os
+import math
+import typing as t
+import logging
+import threading
+import traceback
+from errno import EIO, EBADF, EINVAL, ENOENT
+from functools import partial
+
+try:
+    import trio  # type: ignore
+    import pyfuse3  # type: ignore
+except ImportError:  # pragma: no cover
+    trio = None
+    pyfuse3 = None
+
+logger = logging.getLogger(__name__)
+
+ROOT_INODE = 1
+
+# The amount of seconds the kernel may cache entries and attributes, these are
+# the defaults of libfuse which the fusepy engine uses.
+ENTRY_TIMEOUT = 1.0
+ATTR_TIMEOUT = 1.0
+
+
+def is_available() -> bool:
+    """Check if the pyfuse3 engine can be used.
+    """
+    return pyfuse3 is not None
+
+
+class InodeMap:
+    """The mapping between the inodes used by pyfuse3 and the paths used by
+    CGFS.
+
+    Inodes are created when the kernel looks up a path, and removed when the
+    kernel forgets about them.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._paths = {ROOT_INODE: '/'}  # type: t.Dict[int, str]
+        self._inodes = {'/': ROOT_INODE}  # type: t.Dict[str, int]
+        self._lookups = {}  # type: t.Dict[int, int]
+        self._next_inode = ROOT_INODE + 1
+
+    def get_path(self, inode: int) -> str:
+        with self._lock:
+            try:
+                return self._paths[inode]
+            except KeyError:
+                raise pyfuse3.FUSEError(ENOENT)
+
+    def get_child_path(self, parent_inode: int, name: bytes) -> str:
+        parent = self.get_path(parent_inode)
+        return os.path.join(parent, os.fsdecode(name))
+
+    def lookup(self, path: str) -> int:
+        """Get the inode for the given path, increasing its lookup count.
+        """
+        with self._lock:
+            inode = self._inodes.get(path)
+            if inode is None:
+                inode = self._next_inode
+                self._next_inode += 1
+                self._inodes[path] = inode
+                self._paths[inode] = path
+            self._lookups[inode] = self._lookups.get(inode, 0) + 1
+            return inode
+
+    def forget(self, inode: int, amount: int) -> None:
+        with self._lock:
+            left = self._lookups.get(inode, 0) - amount
+            if left > 0 or inode == ROOT_INODE:
+                self._lookups[inode] = left
+                return
+
+            self._lookups.pop(inode, None)
+            path = self._paths.pop(inode, None)
+            if path is not None and self._inodes.get(path) == inode:
+                del self._inodes[path]
+
+    def remove(self, path: str) -> None:
+        """Remove a path that no longer exists, its inode stays valid until it
+        is forgotten.
+        """
+        with self._lock:
+            self._inodes.pop(path, None)
+
+    def rename(self, old: str, new: str) -> None:
+        """Move ``old`` and everything below it to ``new``.
+        """
+        with self._lock:
+            prefix = old.rstrip('/') + '/'
+            for path, inode in list(self._inodes.items()):
+                if path == old or path.startswith(prefix):
+                    moved = new + path[len(old):]
+                    del self._inodes[path]
+                    self._inodes[moved] = inode
+                    self._paths[inode] = moved
+
+
+class Pyfuse3Operations(pyfuse3.Operations if pyfuse3 else object):
+    """The pyfuse3 operations, implemented using the (fusepy style) operations
+    of CGFS.
+
+    :param fs: The file system to serve.
+    :param max_threads: The maximum amount of operations of ``fs`` that may
+        run at the same time.
+    :param negative_timeout: The amount of seconds the kernel may remember
+        that a path does not exist.
+    """
+    enable_writeback_cache = False
+
+    def __init__(
+        self,
+        fs: t.Any,
+        max_threads: int = 64,
+        negative_timeout: float = 1.0
+    ) -> None:
+        super().__init__()
+        self.fs = fs
+        self.inodes = InodeMap()
+        self.negative_timeout = negative_timeout
+        self._limiter = trio.CapacityLimiter(max_threads)
+
+    def _get_fh_path(self, fh: int) -> str:
+        try:
+            return self.fs.get_path_of_fh(fh)
+        except KeyError:
+            raise pyfuse3.FUSEError(EBADF)
+
+    async def _run(self, op: str, *args: t.Any) -> t.Any:
+        logger.debug('-> %s %r', op, args)
+        fun = getattr(self.fs, op)
+        try:
+            res = await trio.to_thread.run_sync(
+                partial(fun, *args), limiter=self._limiter
+            )
+        except OSError as e:
+            # This includes the ``FuseOSError`` raised by CGFS.
+            logger.debug('<- %s %r', op, e)
+            raise pyfuse3.FUSEError(e.errno or EIO)
+        except Exception:
+            logger.error('Unexpected error during %s', op)
+            logger.debug(traceback.format_exc())
+            raise pyfuse3.FUSEError(EIO)
+        logger.debug('<- %s', op)
+        return res
+
+    def _make_entry(
+        self, inode: int, attrs: t.Dict[str, t.Any]
+    ) -> 'pyfuse3.EntryAttributes':
+        entry = pyfuse3.EntryAttributes()
+        entry.st_ino = inode
+        entry.generation = 0
+        entry.entry_timeout = ENTRY_TIMEOUT
+        entry.attr_timeout = ATTR_TIMEOUT
+        entry.st_mode = attrs['st_mode']
+        entry.st_nlink = attrs.get('st_nlink', 1)
+        entry.st_uid = attrs.get('st_uid', 0)
+        entry.st_gid = attrs.get('st_gid', 0)
+        entry.st_rdev = 0
+        entry.st_size = attrs.get('st_size') or 0
+        entry.st_blksize = 512
+        entry.st_blocks = math.ceil(entry.st_size / 512)
+        for key in ['st_atime', 'st_mtime', 'st_ctime']:
+            setattr(entry, key + '_ns', int(float(attrs.get(key, 0)) * 1e9))
+        return entry
+
+    async def _lookup_path(self, path: str) -> 'pyfuse3.EntryAttributes':
+        attrs = await self._run('getattr', path, None)
+        return self._make_entry(self.inodes.lookup(path), attrs)
+
+    async def lookup(
+        self, parent_inode: int, name: bytes, ctx: t.Any = None
+    ) -> 'pyfuse3.EntryAttributes':
+        path = self.inodes.get_child_path(parent_inode, name)
+        try:
+            return await self._lookup_path(path)
+        except pyfuse3.FUSEError as e:
+            if e.errno != ENOENT:
+                raise
+            # An entry without inode lets the kernel remember that the path
+            # does not exist.
+            entry = pyfuse3.EntryAttributes()
+            entry.st_ino = 0
+            entry.entry_timeout = self.negative_timeout
+            return entry
+
+    async def forget(self, inode_list: t.List[t.Tuple[int, int]]) -> None:
+        for inode, amount in inode_list:
+            self.inodes.forget(inode, amount)
+
+    async def getattr(self, inode: int,
+                      ctx: t.Any = None) -> 'pyfuse3.EntryAttributes':
+        attrs = await self._run('getattr', self.inodes.get_path(inode), None)
+        return self._make_entry(inode, attrs)
+
+    async def setattr(
+        self, inode: int, attr: 'pyfuse3.EntryAttributes', fields: t.Any,
+        fh: t.Optional[int], ctx: t.Any
+    ) -> 'pyfuse3.EntryAttributes':
+        path = self.inodes.get_path(inode)
+
+        if fields.update_size:
+            await self._run('truncate', path, attr.st_size, fh)
+        if fields.update_mode:
+            await self._run('chmod', path, attr.st_mode)
+        if fields.update_uid or fields.update_gid:
+            await self._run('chown', path, attr.st_uid, attr.st_gid)
+        if fields.update_atime or fields.update_mtime:
+            cur = await self._run('getattr', path, fh)
+            atime = (
+                attr.st_atime_ns / 1e9
+                if fields.update_atime else cur['st_atime']
+            )
+            mtime = (
+                attr.st_mtime_ns / 1e9
+                if fields.update_mtime else cur['st_mtime']
+            )
+            await self._run('utimens', path, (atime, mtime))
+
+        return await self.getattr(inode)
+
+    async def opendir(self, inode: int, ctx: t.Any) -> int:
+        # We use the inode as handle, as CGFS does not need directory handles.
+        self.inodes.get_path(inode)
+        return inode
+
+    async def readdir(self, fh: int, start_id: int, token: t.Any) -> None:
+        path = self.inodes.get_path(fh)
+        entries = await self._run('readdir', path, None)
+        names = [e if isinstance(e, str) else e[0] for e in entries]
+        known = {e[0]: e[1] for e in entries if not isinstance(e, str)}
+        names = [n for n in names if n not in ('.', '..')]
+
+        for i in range(start_id, len(names)):
+            child = os.path.join(path, names[i])
+            attrs = known.get(names[i])
+            if attrs is None:
+                try:
+                    attrs = await self._run('getattr', child, None)
+                except pyfuse3.FUSEError:
+                    continue
+            entry = self._make_entry(self.inodes.lookup(child), attrs)
+            if not pyfuse3.readdir_reply(
+                token, os.fsencode(names[i]), entry, i + 1
+            ):
+                # The kernel did not use this entry, so it does not count as
+                # a lookup.
+                self.inodes.forget(entry.st_ino, 1)
+                break
+
+    async def releasedir(self, fh: int) -> None:
+        pass
+
+    async def open(self, inode: int, flags: int,
+                   ctx: t.Any) -> 'pyfuse3.FileInfo':
+        fh = await self._run('open', self.inodes.get_path(inode), flags)
+        return pyfuse3.FileInfo(fh=fh, direct_io=True)
+
+    async def create(
+        self, parent_inode: int, name: bytes, mode: int, flags: int, ctx: t.Any
+    ) -> t.Tuple['pyfuse3.FileInfo', 'pyfuse3.EntryAttributes']:
+        path = self.inodes.get_child_path(parent_inode, name)
+        fh = await self._run('create', path, mode)
+        attrs = await self._run('getattr', path, fh)
+        return (
+            pyfuse3.FileInfo(fh=fh, direct_io=True),
+            self._make_entry(self.inodes.lookup(path), attrs),
+        )
+
+    async def read(self, fh: int, off: int, size: int) -> t.Any:
+        path = self._get_fh_path(fh)
+        # pyfuse3 accepts any object supporting the buffer protocol, so the
+        # (zero copy) result of CGFS can be returned as is.
+        return await self._run('read', path, size, off, fh)
+
+    async def write(self, fh: int, off: int, buf: bytes) -> int:
+        path = self._get_fh_path(fh)
+        return await self._run('write', path, buf, off, fh)
+
+    async def flush(self, fh: int) -> None:
+        await self._run('flush', self._get_fh_path(fh), fh)
+
+    async def fsync(self, fh: int, datasync: bool) -> None:
+        await self._run('fsync', self._get_fh_path(fh), datasync, fh)
+
+    async def release(self, fh: int) -> None:
+        await self._run('release', self._get_fh_path(fh), fh)
+
+    async def mkdir(
+        self, parent_inode: int, name: bytes, mode: int, ctx: t.Any
+    ) -> 'pyfuse3.EntryAttributes':
+        path = self.inodes.get_child_path(parent_inode, name)
+        await self._run('mkdir', path, mode)
+        return await self._lookup_path(path)
+
+    async def unlink(self, parent_inode: int, name: bytes, ctx: t.Any) -> None:
+        path = self.inodes.get_child_path(parent_inode, name)
+        await self._run('unlink', path)
+        self.inodes.remove(path)
+
+    async def rmdir(self, parent_inode: int, name: bytes, ctx: t.Any) -> None:
+        path = self.inodes.get_child_path(parent_inode, name)
+        await self._run('rmdir', path)
+        self.inodes.remove(path)
+
+    async def rename(
+        self, parent_inode_old: int, name_old: bytes, parent_inode_new: int,
+        name_new: bytes, flags: int, ctx: t.Any
+    ) -> None:
+        # We never replace existing files, so ``RENAME_NOREPLACE`` is always
+        # honoured, but we cannot exchange files.
+        if flags & ~pyfuse3.RENAME_NOREPLACE:
+            raise pyfuse3.FUSEError(EINVAL)
+
+        old = self.inodes.get_child_path(parent_inode_old, name_old)
+        new = self.inodes.get_child_path(parent_inode_new, name_new)
+        await self._run('rename', old, new)
+        self.inodes.rename(old, new)
+
+    async def statfs(self, ctx: t.Any) -> 'pyfuse3.StatvfsData':
+        res = await self._run('statfs', '/')
+        stat = pyfuse3.StatvfsData()
+        stat.f_bsize = res['f_bsize']
+        stat.f_frsize = res['f_bsize']
+        stat.f_blocks = res['f_blocks']
+        stat.f_bfree = res['f_bavail']
+        stat.f_bavail = res['f_bavail']
+        stat.f_namemax = 255
+        return stat
+
+
+def mount(
+    fs: t.Any,
+    mountpoint: str,
+    max_threads: int = 64,
+    negative_timeout: float = 1.0,
+    options: t.Sequence[str] = (),
+) -> None:
+    """Mount the given file system using pyfuse3, this blocks until the file
+    system is unmounted.
+
+    :param fs: The file system to mount.
+    :param mountpoint: The directory to mount it on.
+    :param max_threads: The maximum amount of operations of ``fs`` that may
+        run at the same time.
+    :param negative_timeout: The amount of seconds the kernel may remember
+        that a path does not exist.
+    :param options: Extra mount options.
+    """
+    ops = Pyfuse3Operations(
+        fs, max_threads=max_threads, negative_timeout=negative_timeout
+    )
+    fuse_options = set(pyfuse3.default_options)
+    fuse_options.add('fsname=cgfs')
+    fuse_options.update(options)
+
+    pyfuse3.init(ops, mountpoint, fuse_options)
+    try:
+        trio.run(pyfuse3.main)
+    finally:
+        pyfuse3.close(unmount=True)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import typing as t
+import logging
+import threading
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBackQueue:
+    """Run uploads in the background, some time after they were scheduled.
+
+    Uploads are identified by a key (normally the file that is uploaded).
+    Scheduling an upload for a key that is already waiting only replaces its
+    function and postpones it, so many changes shortly after each other are
+    uploaded once. Uploads run one at a time on a single worker thread, and
+    an upload for a key never runs while another upload of that key is still
+    running.
+
+    :param delay: The amount of seconds to wait after the last time an upload
+        was scheduled before running it.
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._waiting = {
+        }  # type: t.Dict[t.Hashable, t.Tuple[float, t.Callable[[], None]]]
+        self._running = set()  # type: t.Set[t.Hashable]
+        self._stopped = False
+        self._uploaded = 0
+        self._worker = threading.Thread(target=self._work)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def schedule(self, key: t.Hashable, fun: t.Callable[[], None]) -> None:
+        """Schedule an upload.
+
+        :param key: The key of the upload.
+        :param fun: The function that does the upload.
+        """
+        with self._cond:
+            self._waiting[key] = (time() + self.delay, fun)
+            self._cond.notify_all()
+
+    def cancel(self, key: t.Hashable) -> None:
+        """Cancel a waiting upload, a running upload is not stopped.
+        """
+        with self._cond:
+            self._waiting.pop(key, None)
+
+    def flush(self, key: t.Hashable) -> None:
+        """Run the waiting upload for the given key on this thread.
+
+        This first waits for a running upload of the key to finish.
+
+        :param key: The key of the upload.
+        """
+        with self._cond:
+            while key in self._running:
+                self._cond.wait()
+            if key not in self._waiting:
+                return
+            _, fun = self._waiting.pop(key)
+            self._running.add(key)
+        self._run(key, fun)
+
+    def flush_all(self) -> None:
+        """Run all waiting uploads and wait for them to finish.
+        """
+        with self._cond:
+            keys = list(self._waiting) + list(self._running)
+        for key in keys:
+            self.flush(key)
+
+    def pending(self) -> int:
+        """Get the amount of uploads that are waiting or running.
+        """
+        with self._cond:
+            return len(self._waiting) + len(self._running)
+
+    def stats(self) -> t.Dict[str, float]:
+        with self._cond:
+            return {
+                'waiting': len(self._waiting),
+                'running': len(self._running),
+                'uploaded': self._uploaded,
+            }
+
+    def _run(self, key: t.Hashable, fun: t.Callable[[], None]) -> None:
+        try:
+            fun()
+        except Exception:
+            logger.exception('Uploading %s failed', key)
+        finally:
+            with self._cond:
+                self._running.discard(key)
+                self._uploaded += 1
+                self._cond.notify_all()
+
+    def _next(self) -> t.Optional[t.Tuple[t.Hashable, t.Callable[[], None]]]:
+        while not self._stopped:
+            ready = [
+                (due, key) for key, (due, _) in self._waiting.items()
+                if key not in self._running
+            ]
+            if not ready:
+                self._cond.wait()
+                continue
+
+            due, key = min(ready, key=lambda item: item[0])
+            now = time()
+            if due > now:
+                self._cond.wait(due - now)
+                continue
+
+            _, fun = self._waiting.pop(key)
+            self._running.add(key)
+            return key, fun
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                item = self._next()
+            if item is None:
+                return
+            self._run(*item)
+
+    def stop(self) -> None:
+        """Stop the worker, waiting uploads are only run by :meth:`flush` and
+        :meth:`flush_all`.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
@@ -36,6 +36,9 @@ setup(
     version=version,
     description='Filesystem for CodeGrade instances',
     install_requires=requires,
+    extras_require={
+        'pyfuse3': ['pyfuse3>=3.0.0', 'trio>=0.15.0'],
+    },
     long_description=open('README.md', 'r', encoding='utf-8').read(),
     long_description_content_type="text/markdown",
     packages=['codegra_fs'],
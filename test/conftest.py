@@ -92,6 +92,9 @@ def mount(
             args.append('--assigned-to-me')
         if ascii_only:
             args.append('--ascii-only')
+        # Run the suite against another engine by setting this variable.
+        if os.environ.get('CGFS_TEST_ENGINE'):
+            args.extend(['--engine', os.environ['CGFS_TEST_ENGINE']])
 
         print('Mounting:', ' '.join(args))
         proc = subprocess.Popen(